@@ -0,0 +1,87 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import argparse
+import random
+import timeit
+
+from bbmp_toolbox import BbmpHelpFormatter
+from bbmp_toolbox.terminal_wrap import _LineIndentation
+
+
+class LineIndentation80:
+    """
+    The implementation that _LineIndentation replaced, for comparison.
+    """
+
+    def __init__(self, text: str):
+        self.for_line = 0
+        self.for_next_line = 0
+
+        for i in range(0, min(80, len(text))):
+            char = text[i]
+
+            if char == "\n" or not char.isspace():
+                self.for_line = i
+                self.for_next_line = self.for_line
+                break
+
+        self.for_next_line = self.for_line
+
+        for i in range(self.for_line, min(80, len(text))):
+            char = text[i]
+
+            if char.isspace() and i > 0 and text[i - 1].isspace():
+                self.for_next_line = i + 1
+
+
+def wide_help(num_options: int) -> str:
+    rng = random.Random(0)
+    words = "set the value of this option used when wrapping text".split()
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        formatter_class=lambda prog: argparse.HelpFormatter(
+            prog, max_help_position=100, width=200
+        ),
+    )
+
+    for i in range(num_options):
+        parser.add_argument(
+            f"--option-{i}-" + "x" * rng.randint(0, 60),
+            metavar="VALUE",
+            help=" ".join(rng.choice(words) for _ in range(40)),
+        )
+
+    return parser.format_help()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=BbmpHelpFormatter,
+        description="""Compares the indentation analysis of terminal_wrap with
+the 80 character look-ahead implementation it replaced, on the lines of the help
+text of a wide argparse parser.""",
+    )
+    parser.add_argument("--options", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = wide_help(args.options).split("\n")
+    print(f"{len(lines)} lines, {sum(map(len, lines))} characters")
+
+    for name, analyze in (
+        ("LineIndentation80", LineIndentation80),
+        ("_LineIndentation", _LineIndentation),
+    ):
+        seconds = min(
+            timeit.repeat(
+                lambda: [analyze(line) for line in lines],
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(f"{name:<20}{seconds * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import argparse
+import logging
+import os
+import random
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bbmp_toolbox import (
+    set_terminal_columns,
+    BbmpHelpFormatter,
+    BbmpLogFormatter,
+    BbmpLogListener,
+    BbmpQueueHandler,
+    WrapCache,
+)
+
+from prose import prose
+
+FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+
+def install_per_worker_handler():
+    set_terminal_columns(100)
+    handler = logging.StreamHandler(open(os.devnull, "w"))
+    handler.setFormatter(BbmpLogFormatter(FORMAT, indent_message=True))
+    logger = logging.getLogger("benchmark")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+
+def install_queue_handler(records):
+    logger = logging.getLogger("benchmark")
+    logger.handlers = [BbmpQueueHandler(records)]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+
+def log_records(seed: int, num_records: int, num_messages: int) -> None:
+    """
+    Logs num_records records, cycling through num_messages distinct messages,
+    like a service repeating the same kinds of log lines.
+    """
+    rng = random.Random(0)
+    messages = [prose(rng, rng.randint(5, 60)) for _ in range(num_messages)]
+    logger = logging.getLogger("benchmark")
+
+    for i in range(num_records):
+        logger.info(messages[(seed + i) % num_messages])
+
+
+class Timer:
+    """
+    Measures the wall time, and the CPU time of this process and of the worker
+    processes that exited in the meantime.
+    """
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children = self._children_cpu()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+        self.children = self._children_cpu() - self._children
+
+    @staticmethod
+    def _children_cpu() -> float:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+
+def run_per_worker(args):
+
+    with Timer() as timer:
+        with ProcessPoolExecutor(
+            args.workers, initializer=install_per_worker_handler
+        ) as pool:
+            list(
+                pool.map(
+                    log_records,
+                    range(args.workers),
+                    [args.records] * args.workers,
+                    [args.messages] * args.workers,
+                )
+            )
+
+    return timer
+
+
+def run_listener(args):
+    with Timer() as timer:
+        formatter = BbmpLogFormatter(
+            FORMAT, indent_message=True, wrap_cache=WrapCache()
+        )
+        listener = BbmpLogListener(open(os.devnull, "w"), formatter)
+
+        with ProcessPoolExecutor(
+            args.workers, initializer=install_queue_handler, initargs=(listener.queue,)
+        ) as pool:
+            list(
+                pool.map(
+                    log_records,
+                    range(args.workers),
+                    [args.records] * args.workers,
+                    [args.messages] * args.workers,
+                )
+            )
+
+        listener.stop()
+
+    return timer
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=BbmpHelpFormatter,
+        description="""Compares logging from a process pool with each worker
+formatting its own records, against sending the records to a BbmpLogListener,
+which formats all of them in the parent process with a WrapCache.
+
+The times include starting the pool, and for the listener, waiting until all
+records have been written. The CPU time of the workers is what the logging
+costs the application's own work, the CPU time of the parent is spent on
+formatting by the listener. Requires the resource module, so it doesn't run on
+Windows.""",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument(
+        "--records", type=int, default=20000, help="The records logged per worker."
+    )
+    parser.add_argument(
+        "--messages",
+        type=int,
+        default=200,
+        help="The number of distinct messages the records cycle through.",
+    )
+    args = parser.parse_args()
+    set_terminal_columns(100)
+    total = args.workers * args.records
+
+    print(
+        f"{'':<12}{'wall s':>10}{'records/s':>12}{'worker cpu s':>14}{'parent cpu s':>14}"
+    )
+
+    for name, run in (("per worker", run_per_worker), ("listener", run_listener)):
+        timer = run(args)
+        print(
+            f"{name:<12}{timer.wall:>10.3f}{total / timer.wall:>12.0f}"
+            f"{timer.children:>14.3f}{timer.cpu:>14.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
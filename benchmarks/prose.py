@@ -0,0 +1,16 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+# The text the benchmarks wrap, shared so that their results stay comparable
+
+import random
+
+WORDS = """the quick brown fox jumps over lazy dog while wrapping text at a given
+width requires finding the last break opportunity before each line ends""".split()
+
+
+def prose(rng: random.Random, num_words: int) -> str:
+    """
+    Returns num_words words chosen at random from WORDS, separated by spaces.
+    """
+    return " ".join(rng.choice(WORDS) for _ in range(num_words))
@@ -0,0 +1,79 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import argparse
+import time
+
+from bbmp_toolbox import terminal_wrap, BbmpHelpFormatter
+
+
+def stack_dump(size: int) -> str:
+    """
+    A single paragraph of at least size characters, with a newline after every
+    line of the stack dump.
+    """
+    lines: list[str] = []
+    total = 0
+    i = 0
+
+    while total < size:
+        line = f"at frame {i} in function_{i % 97}() of module_{i % 13}.py:{i % 1000}"
+        lines.append(line)
+        total += len(line) + 1
+        i += 1
+
+    return "\n".join(lines)[:size]
+
+
+def measure(text: str, width: int, min_seconds: float) -> float:
+    """
+    Returns the shortest time a wrap took, repeating it until min_seconds have
+    passed.
+    """
+    best = float("inf")
+    deadline = time.perf_counter() + min_seconds
+
+    while True:
+        start = time.perf_counter()
+        terminal_wrap(text, width)
+        best = min(best, time.perf_counter() - start)
+
+        if time.perf_counter() >= deadline:
+            return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=BbmpHelpFormatter,
+        description="""Measures how the runtime of terminal_wrap scales with the
+size of the input. The input is a single paragraph, like a wrapped stack dump.
+
+The time per MB should stay roughly constant as the input grows.""",
+    )
+    parser.add_argument("--width", type=int, default=80)
+    parser.add_argument(
+        "--max-size",
+        type=int,
+        default=100 * 1024 * 1024,
+        help="The largest input size in bytes. The sizes start at 1 KB and grow "
+        "tenfold until reaching this.",
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.5,
+        help="Each size is wrapped repeatedly for at least this long.",
+    )
+    args = parser.parse_args()
+
+    print(f"{'size':>12}  {'seconds':>10}  {'s/MB':>8}")
+    size = 1024
+
+    while size <= args.max_size:
+        seconds = measure(stack_dump(size), args.width, args.min_seconds)
+        print(f"{size:>12}  {seconds:>10.4f}  {seconds / size * 1024 * 1024:>8.3f}")
+        size *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Union
+
+from bbmp_toolbox import (
+    set_terminal_columns,
+    terminal_wrap,
+    BbmpHelpFormatter,
+    BbmpLogFormatter,
+)
+
+from prose import prose
+
+
+class Case:
+    """
+    A benchmark case. Each call to run() processes units items, which are either
+    characters or log records.
+    """
+
+    def __init__(self, name: str, unit: str, units: int, run: Callable[[], object]):
+        self.name = name
+        self.unit = unit
+        self.units = units
+        self.run = run
+
+
+def wrap_case(name: str, text: str, width: int = 80) -> Case:
+    return Case(name, "chars", len(text), lambda: terminal_wrap(text, width))
+
+
+def log_lines_case(rng: random.Random) -> Case:
+    # The result shouldn't depend on the terminal running the benchmark
+    set_terminal_columns(80)
+    formatter = BbmpLogFormatter("%(asctime)s %(levelname)s %(message)s", True)
+    records = [
+        logging.LogRecord(
+            "benchmark", logging.INFO, __file__, 0, prose(rng, 12), None, None
+        )
+        for _ in range(1000)
+    ]
+
+    def run():
+        for record in records:
+            formatter.format(record)
+
+    return Case("log_lines", "records", len(records), run)
+
+
+class FixedWidthHelpFormatter(BbmpHelpFormatter):
+    # The result shouldn't depend on the terminal running the benchmark
+    def __init__(self, prog):
+        super().__init__(prog, width=100)
+
+
+def help_case(num_options: int) -> Case:
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        formatter_class=FixedWidthHelpFormatter,
+        description=prose(random.Random(1), 200),
+    )
+
+    for i in range(num_options):
+        parser.add_argument(
+            f"--option-{i}",
+            metavar="VALUE",
+            help=f"Sets option {i}. " + prose(random.Random(i), 30),
+        )
+
+    return Case(
+        f"help_{num_options}_options",
+        "chars",
+        len(parser.format_help()),
+        parser.format_help,
+    )
+
+
+def make_cases() -> list[Case]:
+    rng = random.Random(0)
+
+    quoted = " ".join(
+        rng.choice(
+            [
+                prose(rng, 3),
+                f'"{prose(rng, 4)}"',
+                f"'{prose(rng, 4)}'",
+                f"`{prose(rng, 4)}`",
+                "it's",
+            ]
+        )
+        for _ in range(5000)
+    )
+
+    verbatim_lines = "\n".join(f"    {prose(rng, 15)}" for _ in range(5000))
+    verbatim = f"{prose(rng, 50)}\n\n```\n{verbatim_lines}\n```\n\n{prose(rng, 50)}"
+
+    indented = "\n".join(
+        " " * (2 * (i % 20))
+        + f"--flag-{i}"
+        + "    "
+        + f"{prose(rng, 20)}\n"
+        + " " * (2 * (i % 20) + 14)
+        + prose(rng, 20)
+        for i in range(1000)
+    )
+
+    return [
+        log_lines_case(rng),
+        wrap_case("prose", "\n\n".join(prose(rng, 300) for _ in range(100)), width=72),
+        wrap_case("quoted", quoted),
+        wrap_case("verbatim", verbatim),
+        wrap_case("indented", indented),
+        help_case(300),
+    ]
+
+
+def percentile(sorted_samples: list[float], p: float) -> float:
+    index = min(
+        len(sorted_samples) - 1, int(round(p / 100 * (len(sorted_samples) - 1)))
+    )
+
+    return sorted_samples[index]
+
+
+def measure(case: Case, min_seconds: float, min_samples: int) -> dict:
+    samples: list[float] = []
+    deadline = time.perf_counter() + min_seconds
+
+    while len(samples) < min_samples or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        case.run()
+        samples.append(time.perf_counter() - start)
+
+    samples.sort()
+
+    # Measured in a separate run, because tracing slows down the code a lot
+    tracemalloc.start()
+    case.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "unit": case.unit,
+        "units_per_call": case.units,
+        "samples": len(samples),
+        "throughput": case.units / statistics.mean(samples),
+        "p50_seconds": percentile(samples, 50),
+        "p99_seconds": percentile(samples, 99),
+        "peak_memory_bytes": peak,
+    }
+
+
+def print_results(results: dict, baseline: Union[dict, None]):
+    header = f"{'case':<22}{'throughput':>22}{'p50 ms':>10}{'p99 ms':>10}"
+    header += f"{'peak KiB':>11}"
+
+    if baseline is not None:
+        header += f"{'vs baseline':>13}"
+
+    print(header)
+
+    for name, r in results.items():
+        line = f"{name:<22}{r['throughput']:>12.0f} {r['unit'] + '/s':<9}"
+        line += f"{r['p50_seconds'] * 1000:>10.3f}{r['p99_seconds'] * 1000:>10.3f}"
+        line += f"{r['peak_memory_bytes'] / 1024:>11.0f}"
+
+        if baseline is not None:
+            if name in baseline["results"]:
+                # Above 1 means faster than the baseline
+                ratio = r["throughput"] / baseline["results"][name]["throughput"]
+                line += f"{ratio:>12.2f}x"
+            else:
+                line += f"{'-':>13}"
+
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=BbmpHelpFormatter,
+        description="""Measures the throughput, latency and peak memory use of
+terminal_wrap, BbmpLogFormatter and BbmpHelpFormatter on different kinds of
+input.
+
+To track regressions, save the results of one commit with --save, and compare
+the results of another commit against it with --compare.""",
+    )
+    parser.add_argument(
+        "-k",
+        dest="pattern",
+        default="",
+        help="Only runs the cases whose name contains this string.",
+    )
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=1.0,
+        help="Each case is run repeatedly for at least this long.",
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        default=20,
+        help="Each case is run at least this many times.",
+    )
+    parser.add_argument("--save", type=Path, help="Writes the results to this file.")
+    parser.add_argument(
+        "--compare", type=Path, help="Compares the results to a previously saved file."
+    )
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    results: dict[str, dict] = {}
+
+    for case in make_cases():
+        if args.pattern in case.name:
+            results[case.name] = measure(case, args.min_seconds, args.min_samples)
+
+    print_results(results, baseline)
+
+    if args.save:
+        args.save.write_text(
+            json.dumps(
+                {
+                    "python": sys.version,
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                indent=2,
+            )
+            + "\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
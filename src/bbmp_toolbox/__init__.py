@@ -1,4 +1,65 @@
 # MIT No Attribution
 # Copyright (c) 2025 Attila Szarvas
 
-from .terminal_wrap import terminal_wrap, BbmpHelpFormatter, BbmpLogFormatter
+from typing import TYPE_CHECKING
+
+from .terminal_wrap import (
+    terminal_wrap,
+    terminal_wrap_stream,
+    terminal_wrap_many,
+    terminal_wrap_into,
+    set_terminal_columns,
+    invalidate_terminal_columns,
+    install_sigwinch_handler,
+    WrapCache,
+    WrapDocument,
+    IncrementalWrapper,
+    WrappingTextIO,
+    WrapProfile,
+    profile_stages,
+)
+
+if TYPE_CHECKING:
+    from .async_wrap import (
+        terminal_wrap_async,
+        terminal_wrap_async_stream,
+        terminal_wrap_to_writer,
+    )
+    from .help_formatter import BbmpHelpFormatter, PersistentWrapCache
+    from .log_formatter import (
+        BbmpLogFormatter,
+        BbmpAsyncLogHandler,
+        BbmpQueueHandler,
+        BbmpLogListener,
+    )
+
+# These are only imported on first use, so that wrapping text doesn't have to
+# pay for importing argparse, logging and asyncio.
+_LAZY_ATTRIBUTES = {
+    "terminal_wrap_async": "async_wrap",
+    "terminal_wrap_async_stream": "async_wrap",
+    "terminal_wrap_to_writer": "async_wrap",
+    "BbmpHelpFormatter": "help_formatter",
+    "PersistentWrapCache": "help_formatter",
+    "BbmpLogFormatter": "log_formatter",
+    "BbmpAsyncLogHandler": "log_formatter",
+    "BbmpQueueHandler": "log_formatter",
+    "BbmpLogListener": "log_formatter",
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+
+    module = importlib.import_module(f".{_LAZY_ATTRIBUTES[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
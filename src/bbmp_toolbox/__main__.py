@@ -0,0 +1,301 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import argparse
+import codecs
+import io
+import mmap
+import os
+import sys
+from typing import BinaryIO, Iterator, Union
+
+from .terminal_wrap import (
+    terminal_wrap,
+    terminal_wrap_stream,
+    _WIDTH_MODES,
+    _WRAP_ENGINES,
+)
+
+# Input that can't be memory-mapped, like a pipe, is read in blocks of this
+# size, and the output is buffered in blocks of this size
+_BLOCK_SIZE = 1024 * 1024
+
+# Bytes are decoded and encoded with this, so that input that isn't valid UTF-8
+# is passed through unchanged
+_ERRORS = "surrogateescape"
+
+
+def _is_safe_boundary_line(line: bytes) -> bool:
+    text = line.decode("utf-8", _ERRORS)
+
+    return bool(text.strip()) and "```" not in text
+
+
+def _line_before(data: mmap.mmap, start: int, i: int) -> bytes:
+    return data[data.rfind(b"\n", start, i) + 1 : i]
+
+
+def _line_after(data: mmap.mmap, i: int) -> bytes:
+    end = data.find(b"\n", i)
+
+    return data[i : len(data) if end == -1 else end]
+
+
+def _chunks(data: mmap.mmap, chunk_size: int) -> Iterator[tuple[int, int, int]]:
+    """
+    Splits the data into chunks of at least chunk_size bytes, that can be wrapped
+    independently. Yields the start and end of each chunk, and the number of
+    newlines separating it from the next one.
+
+    Chunks are split at runs of newlines outside verbatim blocks, where the
+    lines before and after the run have text, and no ``` fence. The wrapped
+    chunks joined by the same newlines are then identical to the wrapped data.
+    Since newline bytes never occur inside multibyte UTF-8 sequences, each chunk
+    can be decoded separately.
+    """
+    start = 0
+    search = start + chunk_size
+    fences = 0
+    counted = start
+
+    while True:
+        run_start = data.find(b"\n\n", search)
+
+        if run_start == -1:
+            yield start, len(data), 0
+            return
+
+        run_end = run_start + 2
+
+        while run_end < len(data) and data[run_end] == ord("\n"):
+            run_end += 1
+
+        # Fences can't straddle the newlines that the counting is split at
+        fences += data[counted:run_start].count(b"```")
+        counted = run_start
+        search = run_end
+
+        if (
+            fences % 2 == 0
+            and run_end < len(data)
+            and _is_safe_boundary_line(_line_before(data, start, run_start))
+            and _is_safe_boundary_line(_line_after(data, run_end))
+        ):
+            yield start, run_start, run_end - run_start
+            start = run_end
+            search = start + chunk_size
+            fences = 0
+            counted = start
+
+
+def _release_pages(data: mmap.mmap, start: int, end: int) -> int:
+    """
+    Drops the pages of the mapping, that are entirely in [start, end), from
+    the resident memory of the process, where the platform supports it. Returns
+    the start of the first page not dropped.
+    """
+    end -= end % mmap.PAGESIZE
+
+    if end > start and hasattr(mmap, "MADV_DONTNEED"):
+        data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+    return max(start, end)
+
+
+def _wrap_chunk(data: bytes, width: int, engine: str, width_mode: str) -> bytes:
+    text = data.decode("utf-8", _ERRORS)
+
+    return terminal_wrap(text, width, engine, width_mode=width_mode).encode(
+        "utf-8", _ERRORS
+    )
+
+
+def _wrap_mapped(
+    data: mmap.mmap,
+    width: int,
+    engine: str,
+    width_mode: str,
+    workers: int,
+    chunk_size: int,
+) -> Iterator[bytes]:
+    chunks = _chunks(data, chunk_size)
+
+    # The pages already read are released, otherwise the whole file would stay
+    # resident until the end
+    released = 0
+
+    if workers <= 1:
+        for start, end, newlines in chunks:
+            chunk = data[start:end]
+            released = _release_pages(data, released, end)
+            yield _wrap_chunk(chunk, width, engine, width_mode)
+            yield b"\n" * newlines
+
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Only a few chunks per worker are in flight, so that the memory use doesn't
+    # grow with the size of the input
+    with ProcessPoolExecutor(workers) as pool:
+        pending: deque = deque()
+
+        for start, end, newlines in chunks:
+            chunk = data[start:end]
+            released = _release_pages(data, released, end)
+            pending.append(
+                (pool.submit(_wrap_chunk, chunk, width, engine, width_mode), newlines)
+            )
+
+            if len(pending) >= 2 * workers:
+                future, newlines = pending.popleft()
+                yield future.result()
+                yield b"\n" * newlines
+
+        while pending:
+            future, newlines = pending.popleft()
+            yield future.result()
+            yield b"\n" * newlines
+
+
+def _read_blocks(stream: BinaryIO) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(_ERRORS)
+
+    while True:
+        block = stream.read(_BLOCK_SIZE)
+
+        if not block:
+            yield decoder.decode(b"", final=True)
+            return
+
+        yield decoder.decode(block)
+
+
+def _wrap_input(
+    stream: BinaryIO,
+    width: int,
+    engine: str,
+    width_mode: str,
+    workers: int,
+    chunk_size: int,
+) -> Iterator[bytes]:
+    try:
+        data: Union[mmap.mmap, None] = mmap.mmap(
+            stream.fileno(), 0, access=mmap.ACCESS_READ
+        )
+    except (OSError, ValueError, io.UnsupportedOperation):
+        # Pipes and terminals can't be mapped, and neither can empty files
+        data = None
+
+    if data is None:
+        lines = terminal_wrap_stream(_read_blocks(stream), width, engine, width_mode)
+
+        for i, line in enumerate(lines):
+            yield (line if i == 0 else "\n" + line).encode("utf-8", _ERRORS)
+
+        return
+
+    with data:
+        yield from _wrap_mapped(data, width, engine, width_mode, workers, chunk_size)
+
+
+def _prog() -> str:
+    """
+    The name the program was invoked with, either as the bbmp-wrap console
+    script, or with python -m.
+    """
+    name = os.path.basename(sys.argv[0]) if sys.argv else ""
+
+    if not name or name == "__main__.py":
+        return "python -m bbmp_toolbox"
+
+    return name
+
+
+def main(argv: Union[list[str], None] = None) -> None:
+    from .help_formatter import BbmpHelpFormatter
+
+    parser = argparse.ArgumentParser(
+        prog=_prog(),
+        formatter_class=BbmpHelpFormatter,
+        description="""Wraps a file with terminal_wrap, and writes the result to
+the standard output.
+
+Files are memory-mapped and split into chunks at paragraph breaks outside
+verbatim blocks, so that files larger than the available memory can be wrapped,
+and the chunks can be wrapped in parallel. The standard input is wrapped as a
+stream, unless it's redirected from a file.""",
+    )
+    parser.add_argument(
+        "file",
+        nargs="?",
+        default="-",
+        help="The UTF-8 encoded file to wrap, or - for the standard input.",
+    )
+    parser.add_argument(
+        "-w",
+        "--width",
+        type=int,
+        help="The width to wrap to. Defaults to the width of the terminal.",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="The number of processes wrapping the chunks of a file.",
+    )
+    parser.add_argument("--engine", choices=tuple(_WRAP_ENGINES), default="slices")
+    parser.add_argument("--width-mode", choices=_WIDTH_MODES, default="chars")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=16 * 1024 * 1024,
+        help="The minimum size of the chunks in bytes.",
+    )
+    args = parser.parse_args(argv)
+
+    width = args.width
+
+    if width is None:
+        import shutil
+
+        width = shutil.get_terminal_size().columns
+
+    try:
+        if args.file == "-":
+            stream: BinaryIO = sys.stdin.buffer
+        else:
+            stream = open(args.file, "rb")
+
+        output = open(sys.stdout.fileno(), "wb", buffering=_BLOCK_SIZE, closefd=False)
+
+        with stream, output:
+            wrote = False
+
+            for part in _wrap_input(
+                stream,
+                width,
+                args.engine,
+                args.width_mode,
+                args.workers,
+                args.chunk_size,
+            ):
+                if part:
+                    output.write(part)
+                    wrote = True
+
+            if wrote:
+                output.write(b"\n")
+    except BrokenPipeError:
+        # E.g. piped into head. Python would print an error while flushing
+        # stdout at exit otherwise.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except OSError as e:
+        parser.exit(1, f"{parser.prog}: error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
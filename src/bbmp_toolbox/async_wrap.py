@@ -0,0 +1,182 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import asyncio
+import codecs
+import functools
+from concurrent.futures import Executor
+from typing import AsyncIterable, AsyncIterator, Union
+
+from .terminal_wrap import (
+    terminal_wrap,
+    _check_width_mode,
+    _get_terminal_columns,
+    _get_wrap_engine,
+    _LineAssembler,
+    _Paragraph,
+    _StreamParser,
+    _wrap_one,
+)
+
+# Texts and paragraphs at least this long are wrapped in an executor, shorter
+# ones on the event loop, where wrapping them takes less time than handing them
+# over
+ASYNC_THRESHOLD = 64 * 1024
+
+# Text is read from a StreamReader, and written to a StreamWriter in blocks of
+# this size
+_BLOCK_SIZE = 64 * 1024
+
+
+async def terminal_wrap_async(
+    text: str,
+    width: Union[int, None] = None,
+    engine: str = "slices",
+    width_mode: str = "chars",
+    executor: Union[Executor, None] = None,
+    threshold: int = ASYNC_THRESHOLD,
+) -> str:
+    """
+    Returns the same result as terminal_wrap, but texts of at least threshold
+    characters are wrapped in the executor, or the default executor of the
+    loop, so that the event loop isn't blocked.
+
+    In the default thread pool, the wrapping still holds the GIL most of the
+    time, but the loop gets to run at every switch interval. A
+    ProcessPoolExecutor doesn't slow down the loop at all.
+    """
+    _get_wrap_engine(engine)
+    _check_width_mode(width_mode)
+
+    if width is None:
+        width = _get_terminal_columns(fallback=1000000)
+
+    if len(text) < threshold:
+        return terminal_wrap(text, width, engine, width_mode=width_mode)
+
+    return await asyncio.get_running_loop().run_in_executor(
+        executor,
+        functools.partial(terminal_wrap, text, width, engine, width_mode=width_mode),
+    )
+
+
+async def _text_chunks(
+    source: Union[asyncio.StreamReader, AsyncIterable[Union[str, bytes]]],
+) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    if isinstance(source, asyncio.StreamReader):
+        while True:
+            block = await source.read(_BLOCK_SIZE)
+
+            if not block:
+                break
+
+            yield decoder.decode(block)
+    else:
+        async for chunk in source:
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+    yield decoder.decode(b"", final=True)
+
+
+async def terminal_wrap_async_stream(
+    source: Union[asyncio.StreamReader, AsyncIterable[Union[str, bytes]]],
+    width: Union[int, None] = None,
+    engine: str = "slices",
+    width_mode: str = "chars",
+    executor: Union[Executor, None] = None,
+    threshold: int = ASYNC_THRESHOLD,
+) -> AsyncIterator[str]:
+    """
+    Like terminal_wrap_stream, but reads the text from a StreamReader, or an
+    async iterable of str or UTF-8 encoded bytes chunks, and yields the wrapped
+    lines as they become final.
+
+    Paragraphs of at least threshold characters are wrapped in the executor, or
+    the default executor of the loop, and the loop gets to run after each
+    chunk, even if the next one is available immediately.
+    """
+    wrap = _get_wrap_engine(engine)
+    _check_width_mode(width_mode)
+
+    if width is None:
+        width = _get_terminal_columns(fallback=1000000)
+
+    loop = asyncio.get_running_loop()
+    parser = _StreamParser(width_mode)
+    assembler = _LineAssembler()
+
+    async def wrap_and_assemble(p: _Paragraph) -> list[str]:
+        if len(p.text) < threshold:
+            wrapped = _wrap_one(p, width, wrap)
+        else:
+            wrapped = await loop.run_in_executor(executor, _wrap_one, p, width, wrap)
+
+        return assembler.add(p, wrapped)
+
+    async for chunk in _text_chunks(source):
+        for p in parser.feed(chunk):
+            for line in await wrap_and_assemble(p):
+                yield line
+
+        await asyncio.sleep(0)
+
+    for p in parser.close():
+        for line in await wrap_and_assemble(p):
+            yield line
+
+    for line in assembler.finish():
+        yield line
+
+
+async def terminal_wrap_to_writer(
+    source: Union[str, asyncio.StreamReader, AsyncIterable[Union[str, bytes]]],
+    writer: asyncio.StreamWriter,
+    width: Union[int, None] = None,
+    engine: str = "slices",
+    width_mode: str = "chars",
+    executor: Union[Executor, None] = None,
+    threshold: int = ASYNC_THRESHOLD,
+) -> None:
+    """
+    Writes the wrapped text to the writer, UTF-8 encoded, without a final
+    newline. The source is a str wrapped with terminal_wrap_async, or a stream
+    wrapped with terminal_wrap_async_stream.
+
+    The output is written in blocks, and the writer is drained after each one,
+    so that a slow reader holds back the wrapping, instead of the output piling
+    up in the writer's buffer.
+    """
+    if isinstance(source, str):
+        wrapped = await terminal_wrap_async(
+            source, width, engine, width_mode, executor, threshold
+        )
+        encoded = wrapped.encode("utf-8")
+
+        for i in range(0, len(encoded), _BLOCK_SIZE):
+            writer.write(encoded[i : i + _BLOCK_SIZE])
+            await writer.drain()
+
+        return
+
+    parts: list[str] = []
+    size = 0
+    first = True
+
+    async for line in terminal_wrap_async_stream(
+        source, width, engine, width_mode, executor, threshold
+    ):
+        parts.append(line if first else "\n" + line)
+        size += len(parts[-1])
+        first = False
+
+        if size >= _BLOCK_SIZE:
+            writer.write("".join(parts).encode("utf-8"))
+            await writer.drain()
+            parts = []
+            size = 0
+
+    if parts:
+        writer.write("".join(parts).encode("utf-8"))
+        await writer.drain()
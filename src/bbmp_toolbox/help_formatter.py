@@ -0,0 +1,263 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import atexit
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from argparse import HelpFormatter
+from typing import Union
+
+from .terminal_wrap import terminal_wrap, WrapCache, _get_terminal_columns
+
+# Files smaller than this are read into memory, larger ones are memory-mapped
+_MMAP_THRESHOLD = 64 * 1024
+
+# Each entry is the digest of its key, the length of the wrapped text, and the
+# wrapped text encoded as UTF-8
+_ENTRY_HEADER = struct.Struct("<16sI")
+
+
+def _code_version() -> Union[str, None]:
+    """
+    Identifies the wrapping code, so that results cached by a different version
+    are not used. Reinstalling or upgrading the package, or editing the source,
+    changes it. None if it can't be determined, e.g. when running from a zip
+    file.
+    """
+    try:
+        stat = os.stat(os.path.join(os.path.dirname(__file__), "terminal_wrap.py"))
+    except OSError:
+        return None
+
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+class PersistentWrapCache:
+    """
+    A cache of terminal_wrap results stored in a file, so that the help of a
+    large command line tool is only wrapped once, and later invocations read it
+    from the file.
+
+    Entries are keyed on a hash of the text, the width, the engine and the width
+    mode. The file is ignored if it was written by a different version of the
+    wrapping code, or if it's unreadable, and any text not found in it is
+    wrapped live. New entries are written to the file by save(), which is also
+    called at exit. The file is replaced atomically, and when it would exceed
+    max_bytes, the entries not used by this process are dropped first.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], max_bytes: int = 4 * 1024 * 1024):
+        self.path = os.fspath(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        version = _code_version()
+        # Without a version, the file is neither read nor written
+        self._header = (
+            b"" if version is None else f"bbmp-wrap-cache 1 {version}\n".encode()
+        )
+        self._data: Union[bytes, mmap.mmap] = b""
+        self._index: dict[bytes, tuple[int, int]] = {}
+        self._used: set[bytes] = set()
+        self._added: dict[bytes, str] = {}
+        self._save_at_exit = False
+        self._lock = threading.Lock()
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._index.keys() | self._added.keys())
+
+    def _open(self) -> None:
+        if not self._header:
+            return
+
+        try:
+            with open(self.path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+
+                if size < len(self._header):
+                    return
+
+                if size < _MMAP_THRESHOLD:
+                    data: Union[bytes, mmap.mmap] = f.read()
+                else:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+
+        if data[: len(self._header)] != self._header:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+            return
+
+        offset = len(self._header)
+
+        # A truncated entry ends the file
+        while offset + _ENTRY_HEADER.size <= len(data):
+            digest, length = _ENTRY_HEADER.unpack_from(data, offset)
+            offset += _ENTRY_HEADER.size
+
+            if offset + length > len(data):
+                break
+
+            self._index[digest] = (offset, length)
+            offset += length
+
+        self._data = data
+
+    def _close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+        self._data = b""
+        self._index = {}
+
+    def _stored(self, digest: bytes) -> Union[str, None]:
+        if digest in self._added:
+            return self._added[digest]
+
+        if digest not in self._index:
+            return None
+
+        offset, length = self._index[digest]
+
+        try:
+            return self._data[offset : offset + length].decode("utf-8", "surrogatepass")
+        except UnicodeDecodeError:
+            return None
+
+    def wrap(
+        self,
+        text: str,
+        width: Union[int, None] = None,
+        engine: str = "slices",
+        width_mode: str = "chars",
+    ) -> str:
+        if width is None:
+            width = _get_terminal_columns(fallback=1000000)
+
+        key = hashlib.blake2b(digest_size=16)
+        key.update(f"{width}\0{engine}\0{width_mode}\0".encode())
+        key.update(text.encode("utf-8", "surrogatepass"))
+        digest = key.digest()
+
+        with self._lock:
+            wrapped = self._stored(digest)
+
+            if wrapped is not None:
+                self.hits += 1
+                self._used.add(digest)
+                return wrapped
+
+            self.misses += 1
+
+        wrapped = terminal_wrap(text, width, engine, width_mode=width_mode)
+
+        with self._lock:
+            self._added[digest] = wrapped
+            self._used.add(digest)
+
+            if not self._save_at_exit:
+                self._save_at_exit = True
+                atexit.register(self.save)
+
+        return wrapped
+
+    def save(self) -> None:
+        """
+        Writes the new entries to the file. Errors are ignored, since the cache
+        is only an optimization.
+        """
+        import tempfile
+
+        with self._lock:
+            if not self._added or not self._header:
+                return
+
+            entries: dict[bytes, bytes] = {}
+            size = len(self._header)
+            # The entries used by this process are kept even above max_bytes
+            digests = sorted(
+                self._index.keys() | self._added.keys(),
+                key=lambda digest: digest not in self._used,
+            )
+
+            for digest in digests:
+                wrapped = self._stored(digest)
+
+                if wrapped is None:
+                    continue
+
+                encoded = wrapped.encode("utf-8", "surrogatepass")
+                size += _ENTRY_HEADER.size + len(encoded)
+
+                if size > self.max_bytes and digest not in self._used:
+                    break
+
+                entries[digest] = encoded
+
+            try:
+                fd, temp_path = tempfile.mkstemp(
+                    prefix=".bbmp-wrap-cache-",
+                    dir=os.path.dirname(os.path.abspath(self.path)),
+                )
+            except OSError:
+                return
+
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(self._header)
+
+                    for digest, encoded in entries.items():
+                        f.write(_ENTRY_HEADER.pack(digest, len(encoded)))
+                        f.write(encoded)
+
+                # A mapped file can't be replaced on Windows
+                self._close()
+                os.replace(temp_path, self.path)
+                self._added = {}
+            except OSError:
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
+
+            self._close()
+            self._open()
+
+    def invalidate(self) -> None:
+        """
+        Removes all entries, including the file.
+        """
+        with self._lock:
+            self._close()
+            self._added = {}
+            self._used = set()
+
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class BbmpHelpFormatter(HelpFormatter):
+    # Set this to a WrapCache to reuse the wrapped descriptions and epilogs
+    # across help renders, or to a PersistentWrapCache to also reuse them across
+    # invocations of the program.
+    wrap_cache: Union[WrapCache, PersistentWrapCache, None] = None
+
+    # Set this to "display" to measure the text in terminal columns, see
+    # terminal_wrap.
+    width_mode = "chars"
+
+    def _fill_text(self, text, width, indent):
+        if self.wrap_cache is not None:
+            return self.wrap_cache.wrap(
+                indent + text, width, width_mode=self.width_mode
+            )
+
+        return terminal_wrap(indent + text, width, width_mode=self.width_mode)
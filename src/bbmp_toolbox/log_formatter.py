@@ -0,0 +1,354 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import copy
+import logging
+import logging.handlers
+import queue
+import re
+from typing import Iterator, Union
+
+from .terminal_wrap import (
+    terminal_wrap,
+    WrapCache,
+    _check_width_mode,
+    _get_terminal_columns,
+    _visible_width,
+)
+
+_MESSAGE_FIELD = re.compile(r"%\(message\)s")
+
+
+def _split_format(
+    fmt: str,
+) -> Union[tuple[Union[logging.PercentStyle, None], ...], None]:
+    """
+    Returns the styles formatting the parts of the format string before and
+    after its message field, or None if it doesn't contain exactly one message
+    field. The style of an empty part is None, because PercentStyle would
+    replace it with the default format.
+    """
+    matches = list(_MESSAGE_FIELD.finditer(fmt))
+
+    if len(matches) != 1:
+        return None
+
+    parts = (fmt[: matches[0].start()], fmt[matches[0].end() :])
+
+    return tuple(logging.PercentStyle(part) if part else None for part in parts)
+
+
+class BbmpLogFormatter(logging.Formatter):
+    def __init__(
+        self,
+        format: Union[str, None],
+        indent_message=False,
+        wrap_cache: Union[WrapCache, None] = None,
+        width_mode: str = "chars",
+    ):
+        _check_width_mode(width_mode)
+        super().__init__(format)
+        self.indent_message = indent_message
+        self.wrap_cache = wrap_cache
+        self.width_mode = width_mode
+
+        # With indent_message, the parts around the message are formatted
+        # separately, instead of searching for the message in the formatted
+        # record
+        self._message_styles = _split_format(self._style._fmt)
+
+    def _prefix_width(self, prefix: str) -> int:
+        if "\x1b" not in prefix and (self.width_mode == "chars" or prefix.isascii()):
+            return len(prefix)
+
+        return _visible_width(prefix, self.width_mode == "display")
+
+    def _format_parts(self, record) -> tuple[str, str, int]:
+        """
+        Returns the part of the formatted record before the message, the message
+        followed by the rest of the formatted record, and the indentation of
+        the lines after the first.
+        """
+        if self._message_styles is not None:
+            prefix_style, suffix_style = self._message_styles
+            prefix = "" if prefix_style is None else prefix_style.format(record)
+            body = record.message
+
+            if suffix_style is not None:
+                body += suffix_style.format(record)
+        else:
+            formatted = super().formatMessage(record)
+            i = formatted.find(record.message) if record.message else -1
+
+            if i == -1:
+                prefix, body = formatted, ""
+            else:
+                prefix, body = formatted[:i], formatted[i:]
+
+        return prefix, body, self._prefix_width(prefix) + 1
+
+    def _format_unwrapped(self, record) -> str:
+        if not self.indent_message:
+            return super().formatMessage(record)
+
+        prefix, body, indent = self._format_parts(record)
+
+        return prefix + "\n".join(
+            " " + l if i == 0 else " " * indent + l
+            for i, l in enumerate(body.splitlines())
+        )
+
+    def _wrap(self, text: str, width: Union[int, None] = None) -> str:
+        if self.wrap_cache is not None:
+            return self.wrap_cache.wrap(text, width, width_mode=self.width_mode)
+
+        return terminal_wrap(text, width, width_mode=self.width_mode)
+
+    def _indented_lines(self, record, width: int) -> Union[Iterator[str], None]:
+        """
+        Wraps only the message, to the width remaining after the indentation,
+        and yields the lines with the prefix or the indentation in front. Returns
+        None if there's no room for the message next to the prefix.
+        """
+        prefix, body, indent = self._format_parts(record)
+
+        if indent >= width:
+            return None
+
+        def lines() -> Iterator[str]:
+            wrapped = self._wrap(body, width - indent)
+
+            for i, line in enumerate(wrapped.split("\n")):
+                if i == 0:
+                    yield prefix + " " + line if line else prefix.rstrip()
+                else:
+                    yield " " * indent + line if line else ""
+
+        return lines()
+
+    def formatMessage(self, record):
+        if not getattr(record, "bbmp_wrap", True):
+            return self._format_unwrapped(record)
+
+        if self.indent_message:
+            lines = self._indented_lines(
+                record, _get_terminal_columns(fallback=1000000)
+            )
+
+            if lines is not None:
+                return "\n".join(lines)
+
+        return self._wrap(self._format_unwrapped(record))
+
+
+class _BlockingSentinelListener(logging.handlers.QueueListener):
+    _sentinel = None
+
+    def __init__(self, records: queue.Queue, *handlers: logging.Handler):
+        super().__init__(records, *handlers, respect_handler_level=True)
+        self._records = records
+
+    def enqueue_sentinel(self):
+        # The base implementation uses put_nowait, which fails on a full
+        # bounded queue
+        self._records.put(self._sentinel)
+
+
+class BbmpAsyncLogHandler(logging.handlers.QueueHandler):
+    """
+    Passes records to the given handlers on a background thread, so that the
+    formatting, including the wrapping done by BbmpLogFormatter, doesn't happen
+    on the thread emitting the record. Records are handled in the order they
+    were emitted.
+
+    The queue holds at most maxsize records. When it's full, the overflow policy
+    decides what happens to a new record:
+      "block":     wait until there's room in the queue.
+      "drop":      discard the record, and increment the dropped counter.
+      "unwrapped": handle the record on the emitting thread without wrapping it.
+                   Such records may appear out of order.
+
+    Closing the handler, which logging.shutdown() also does, handles all records
+    still in the queue.
+    """
+
+    _OVERFLOW_POLICIES = ("block", "drop", "unwrapped")
+
+    def __init__(
+        self, *handlers: logging.Handler, maxsize: int = 10000, overflow="block"
+    ):
+        if overflow not in self._OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown overflow policy {overflow!r}, expected one of "
+                f"{', '.join(self._OVERFLOW_POLICIES)}"
+            )
+
+        self._records: queue.Queue = queue.Queue(maxsize)
+        super().__init__(self._records)
+        self.overflow = overflow
+        self.dropped = 0
+        self.listener: Union[logging.handlers.QueueListener, None]
+        self.listener = _BlockingSentinelListener(self._records, *handlers)
+        self.listener.start()
+
+    def prepare(self, record):
+        # Unlike QueueHandler.prepare, this doesn't format the record, only
+        # merges the arguments into the message, since they may change by the
+        # time the record is formatted.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == "block":
+            self._records.put(record)
+            return
+
+        try:
+            self._records.put_nowait(record)
+        except queue.Full:
+            if self.overflow == "drop" or self.listener is None:
+                self.dropped += 1
+                return
+
+            record.bbmp_wrap = False
+            self.listener.handle(record)
+
+    def flush(self):
+        """
+        Waits until all records in the queue have been handled.
+        """
+        if self.listener is not None:
+            self._records.join()
+
+    def close(self):
+        try:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+        finally:
+            super().close()
+
+
+_exception_formatter = logging.Formatter()
+
+
+class BbmpQueueHandler(logging.handlers.QueueHandler):
+    """
+    Sends records from worker processes to a BbmpLogListener, unformatted, so
+    that the wrapping happens in the process running the listener.
+
+    Unlike QueueHandler.prepare, the message is not formatted, only the
+    arguments are merged into it, and a traceback is rendered into exc_text,
+    since tracebacks can't be pickled.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+
+            record.exc_info = None
+
+        return record
+
+
+class BbmpLogListener:
+    """
+    Formats the records sent by BbmpQueueHandlers, e.g. in multiprocessing or
+    ProcessPoolExecutor workers, on a background thread of this process, and
+    writes them to the stream, so that the lines of different records don't
+    interleave.
+
+    All records are wrapped by the same formatter, which by default uses a
+    WrapCache. Records that arrive together are written to the stream in a
+    single write, up to max_batch records at a time.
+
+    Pass the queue to the workers, e.g. through the initializer of the pool,
+    and attach a BbmpQueueHandler(queue) to their loggers.
+    """
+
+    def __init__(
+        self,
+        stream=None,
+        formatter: Union[BbmpLogFormatter, None] = None,
+        max_batch: int = 256,
+        context=None,
+    ):
+        import multiprocessing
+        import threading
+
+        if formatter is None:
+            formatter = BbmpLogFormatter("%(message)s", wrap_cache=WrapCache())
+
+        if context is None:
+            context = multiprocessing.get_context()
+
+        self.queue = context.Queue()
+        self.handler = logging.StreamHandler(stream)
+        self.handler.setFormatter(formatter)
+        self.max_batch = max_batch
+        self._thread = threading.Thread(target=self._monitor, daemon=True)
+        self._thread.start()
+
+    def _monitor(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+
+            while batch[-1] is not None and len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+            if batch[-1] is None:
+                return
+
+    def _write(self, batch: list) -> None:
+        handler = self.handler
+        chunks: list[str] = []
+
+        for record in batch:
+            if record is None:
+                break
+
+            try:
+                chunks.append(handler.format(record) + handler.terminator)
+            except Exception:
+                handler.handleError(record)
+
+        if not chunks:
+            return
+
+        handler.acquire()
+
+        try:
+            handler.stream.write("".join(chunks))
+            handler.flush()
+        except Exception:
+            handler.handleError(batch[0])
+        finally:
+            handler.release()
+
+    def stop(self) -> None:
+        """
+        Writes the records still in the queue, and stops the thread. Records
+        sent after this are not written.
+        """
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,106 +1,291 @@
 # MIT No Attribution
 # Copyright (c) 2025 Attila Szarvas
 
-# This module has no external dependencies. It requires Python 3.9 or greater.
-# You can copy and paste this entire file into a standalone script.
+# This module only depends on the standard library. It requires Python 3.9 or
+# greater. The argparse and logging integrations are in help_formatter.py and
+# log_formatter.py, and are still available from this module for
+# compatibility.
 
+import re
+from typing import Callable, Iterable, Iterator, Protocol, Sequence, Union
 
-class _LineIndentation80:
+_INDENTATION_END = re.compile(r"\S|\n")
+_LAST_WHITESPACE_PAIR = re.compile(r".*\s\s", re.DOTALL)
+
+
+class _LineIndentation:
     """
-    Starting at the given index, looks ahead at most 80 characters to determine
-    the indentation that this, and the next line uses.
+    Determines the indentation that this line, and the next line of the same
+    paragraph use. The next line is indented to the end of the last run of
+    multiple whitespaces.
     """
 
+    __slots__ = ("for_line", "for_next_line")
+
     def __init__(self, text: str):
-        self.for_line = 0
-        self.for_next_line = 0
+        indentation_end = _INDENTATION_END.search(text)
+        self.for_line = indentation_end.start() if indentation_end else 0
+        self.for_next_line = self.for_line
+        # The greedy match ends after the last pair of whitespaces. The pair may
+        # start right before for_line, if the line is indented up to a newline.
+        last_pair = _LAST_WHITESPACE_PAIR.match(text, max(0, self.for_line - 1))
 
-        for i in range(0, min(80, len(text))):
-            char = text[i]
+        if last_pair is not None and last_pair.end() > self.for_line:
+            self.for_next_line = last_pair.end()
 
-            if char == "\n" or not char.isspace():
-                self.for_line = i
-                self.for_next_line = self.for_line
-                break
 
-        self.for_next_line = self.for_line
+import os
+import time
+
+
+class _TerminalColumns:
+    """
+    Process-wide cache of the terminal width.
+
+    The cached value expires after ttl seconds, unless the application installed
+    the SIGWINCH handler, which refreshes it when the terminal is resized, and
+    the handler is still in place. A COLUMNS environment variable takes
+    precedence over the cached value, and a pinned value takes precedence over
+    everything.
+    """
+
+    def __init__(self, ttl: float = 1.0):
+        self.ttl = ttl
+        self.pinned: Union[int, None] = None
+        self._columns = 0
+        self._valid = False
+        self._expires = 0.0
+        self._sigwinch_handler: Union[Callable, None] = None
+
+    def invalidate(self) -> None:
+        self._valid = False
+
+    def get(self, fallback: int) -> int:
+        if self.pinned is not None:
+            return self.pinned
+
+        try:
+            columns = int(os.environ["COLUMNS"])
+        except (KeyError, ValueError):
+            columns = 0
+
+        if columns > 0:
+            return columns
+
+        if not self._valid or (
+            not self._sigwinch_handler_is_current()
+            and time.monotonic() >= self._expires
+        ):
+            self._refresh()
+
+        return self._columns if self._columns > 0 else fallback
+
+    def _refresh(self) -> None:
+        import shutil
+
+        self._valid = True
+        self._expires = time.monotonic() + self.ttl
+        self._columns = shutil.get_terminal_size(fallback=(0, 0)).columns
+
+    def _sigwinch_handler_is_current(self) -> bool:
+        if self._sigwinch_handler is None:
+            return False
+
+        import signal
+
+        return signal.getsignal(signal.SIGWINCH) is self._sigwinch_handler
+
+    def install_sigwinch_handler(self) -> bool:
+        import signal
+        import threading
+
+        if (
+            not hasattr(signal, "SIGWINCH")
+            or threading.current_thread() is not threading.main_thread()
+        ):
+            return False
+
+        if self._sigwinch_handler_is_current():
+            return True
+
+        previous_handler = signal.getsignal(signal.SIGWINCH)
+
+        def handler(signum, frame):
+            self.invalidate()
+
+            if callable(previous_handler):
+                previous_handler(signum, frame)
 
-        for i in range(self.for_line, min(80, len(text))):
-            char = text[i]
+        try:
+            signal.signal(signal.SIGWINCH, handler)
+        except (ValueError, OSError):
+            return False
 
-            if char.isspace() and i > 0 and text[i - 1].isspace():
-                self.for_next_line = i + 1
+        self._sigwinch_handler = handler
+
+        return True
+
+
+_terminal_columns = _TerminalColumns()
+
+
+def set_terminal_columns(columns: Union[int, None]) -> None:
+    """
+    Pins the width used by terminal_wrap when it's called without a width, so
+    that the terminal is no longer queried. Passing None restores detection.
+
+    Otherwise the width is queried again at most every second, or right away
+    after a call to invalidate_terminal_columns(), e.g. from the application's
+    own SIGWINCH handler, see also install_sigwinch_handler().
+    """
+    _terminal_columns.pinned = columns
+
+
+def install_sigwinch_handler() -> bool:
+    """
+    Installs a SIGWINCH handler, which queries the terminal width again only
+    when the terminal is resized, instead of every second. The handler calls
+    the one installed before it, if that was set from Python. Returns False if
+    there's no SIGWINCH, or this isn't the main thread.
+
+    Handlers installed from C, e.g. by curses or an extension module, aren't
+    visible to the signal module, so they are replaced without being called.
+    Only call this before any such library is initialized, or not at all. If
+    the application replaces the handler later, the width is queried every
+    second again.
+    """
+    return _terminal_columns.install_sigwinch_handler()
+
+
+def invalidate_terminal_columns() -> None:
+    """
+    Forces the terminal width to be queried again on the next use.
+    """
+    _terminal_columns.invalidate()
 
 
 def _get_terminal_columns(fallback: int = 80) -> int:
-    import shutil
+    return _terminal_columns.get(fallback)
 
-    return shutil.get_terminal_size(fallback=(fallback, 20)).columns
+
+_DOUBLE_QUOTE = 1
+_SINGLE_QUOTE = 2
+_BACKTICK = 4
+_QUOTE_FLAGS = {'"': _DOUBLE_QUOTE, "`": _BACKTICK}
 
 
 class _BreakInhibitor:
+    """
+    Tracks which kinds of quotes are open, as a combination of the quote flags.
+    """
+
+    __slots__ = ("_quote_state",)
+
     def __init__(self) -> None:
-        self._quote_state = {'"': False, "'": False, "`": False}
+        self._quote_state = 0
 
     def update(self, text: str, index: int) -> None:
         char = text[index]
 
-        if char in '"`' and char in self._quote_state:
-            self._quote_state[char] = not self._quote_state[char]
+        if char in _QUOTE_FLAGS:
+            self._quote_state ^= _QUOTE_FLAGS[char]
 
         if (
-            self._quote_state["'"]
+            self._quote_state & _SINGLE_QUOTE
             and not char.isalnum()
             and index > 0
             and text[index - 1] == "'"
         ):
-            self._quote_state["'"] = not self._quote_state["'"]
+            self._quote_state ^= _SINGLE_QUOTE
 
         if (
-            not self._quote_state["'"]
+            not self._quote_state & _SINGLE_QUOTE
             and char == "'"
             and index < len(text) - 1
             and text[index - 1] == " "
         ):
-            self._quote_state["'"] = not self._quote_state["'"]
+            self._quote_state ^= _SINGLE_QUOTE
 
     def active(self) -> bool:
-        return any(self._quote_state.values())
+        return self._quote_state != 0
 
 
 class _Paragraph:
+    __slots__ = ("indentation", "text", "is_verbatim", "columns", "escapes")
+
     def __init__(
-        self, indentation: _LineIndentation80, text: str, verbatim: bool = False
+        self, indentation: _LineIndentation, text: str, verbatim: bool = False
     ):
         self.indentation = indentation
         self.text = text
         self.is_verbatim = verbatim
 
+        # The display column at which each character starts, followed by the
+        # width of the text. None means that each character is one column wide.
+        self.columns: Union[list[int], None] = None
+
+        # The escape sequences removed from the text, and the offsets in the
+        # text where they were.
+        self.escapes: Sequence[tuple[int, str]] = ()
+
 
 class _Block:
-    def __init__(self, text: str, is_verbatim: bool = False):
-        self.text = text
+    """
+    A range of the text being wrapped. The text is only copied, once the lines
+    of the block are split into paragraphs.
+    """
+
+    __slots__ = ("start", "end", "is_verbatim", "indentation")
+
+    def __init__(self, start: int, end: int, is_verbatim: bool = False):
+        self.start = start
+        self.end = end
         self.is_verbatim = is_verbatim
         self.indentation = 0
 
 
+def _rstrip_end(text: str, start: int, end: int) -> int:
+    """
+    Returns the end of text[start:end].rstrip() in text.
+    """
+    while end > start and text[end - 1].isspace():
+        end -= 1
+
+    return end
+
+
 def process_multiline_verbatim_blocks(text: str) -> list[_Block]:
     blocks: list[_Block] = []
+    start = 0
+
+    while True:
+        end = text.find("```", start)
 
-    for i, b in enumerate(text.split("```")):
-        blocks.append(_Block(b, i % 2 == 1))
+        if end == -1:
+            blocks.append(_Block(start, len(text), len(blocks) % 2 == 1))
+            break
+
+        blocks.append(_Block(start, end, len(blocks) % 2 == 1))
+        start = end + 3
 
     for i, block in enumerate(blocks):
         if block.is_verbatim and i > 0:
+            # The trailing spaces of the last line of the previous block
             previous_block = blocks[i - 1]
-            previous_line = previous_block.text.rsplit("\n", 1)[-1]
-            trailing_whitespaces = len(previous_line) - len(previous_line.rstrip(" "))
-            block.indentation = trailing_whitespaces
+            end = previous_block.end
+
+            while end > previous_block.start and text[end - 1] == " ":
+                end -= 1
+
+            block.indentation = previous_block.end - end
 
     return blocks
 
 
-def process_multiple_newlines(blocks_in: list[_Block]) -> list[_Block]:
+_NEWLINE_RUNS = re.compile(r"\n{2,}")
+
+
+def process_multiple_newlines(text: str, blocks_in: list[_Block]) -> list[_Block]:
     """
     Breaks up the text into kind-of-paragraphs, but these paragraphs can still
     contain newlines, however they can't contain contains sequences of newlines
@@ -113,39 +298,342 @@ def process_multiple_newlines(blocks_in: list[_Block]) -> list[_Block]:
             blocks_out.append(block)
             continue
 
-        text = block.text
-        start = 0
+        start = block.start
 
-        i = 0
-        while i < len(text):
-            if text[i] == "\n":
-                j = i + 1
+        for match in _NEWLINE_RUNS.finditer(text, block.start, block.end):
+            blocks_out.append(_Block(start, _rstrip_end(text, start, match.start())))
+            start = match.end()
 
-                while j < len(text) and text[j] == "\n":
-                    j += 1
+            for k in range(1, match.end() - match.start()):
+                blocks_out.append(_Block(start, start))
 
-                num_newlines = j - i
+        if start < block.end:
+            blocks_out.append(_Block(start, _rstrip_end(text, start, block.end)))
 
-                if num_newlines > 1:
-                    blocks_out.append(_Block(text[start:i].rstrip()))
-                    start = i + num_newlines
+    return blocks_out
 
-                    for k in range(1, num_newlines):
-                        blocks_out.append(_Block(""))
 
-                i += num_newlines
-            else:
-                i += 1
+import unicodedata
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain, compress, repeat
+from operator import add, sub
 
-        if start < len(text):
-            blocks_out.append(_Block(text[start:].rstrip()))
 
-    return blocks_out
+def _unicode_version(version: str) -> tuple[int, ...]:
+    return tuple(int(part) for part in version.split("."))
+
+
+class _DisplayWidths:
+    """
+    The number of terminal columns taken up by each code point, stored as ranges
+    of equal width. The ranges are loaded on first use from the table in
+    _display_widths.py, or built from unicodedata if the table was generated
+    with an older Unicode version.
+
+    Combining marks and format characters take up no columns, East Asian wide
+    and fullwidth characters take up two, and everything else takes up one.
+    """
+
+    # Outside of these ranges each code point is one column wide
+    _SCANNED_RANGES = ((0x300, 0x40000), (0xE0000, 0xE1000))
+
+    def __init__(self) -> None:
+        self._starts: Sequence[int] = ()
+        self._widths: Sequence[int] = ()
+
+    def _build(self) -> None:
+        from . import _display_widths
+
+        # The table is generated with the newest supported Python. Older ones
+        # use it too, since the terminal, not Python, decides how characters
+        # added in later Unicode versions are displayed.
+        if _unicode_version(_display_widths.UNIDATA_VERSION) >= _unicode_version(
+            unicodedata.unidata_version
+        ):
+            self._starts = _display_widths.STARTS
+            self._widths = _display_widths.WIDTHS
+        else:
+            self._starts, self._widths = self.scan()
+
+    @classmethod
+    def scan(cls) -> tuple[list[int], list[int]]:
+        """
+        Builds the ranges from unicodedata, which takes a few hundred
+        milliseconds.
+        """
+        starts = [0]
+        widths = [1]
+
+        for first, last in cls._SCANNED_RANGES:
+            for code_point in range(first, last):
+                char = chr(code_point)
+
+                if unicodedata.combining(char) or unicodedata.category(char) in (
+                    "Mn",
+                    "Me",
+                    "Cf",
+                ):
+                    width = 0
+                elif unicodedata.east_asian_width(char) in ("W", "F"):
+                    width = 2
+                else:
+                    width = 1
+
+                if width != widths[-1]:
+                    starts.append(code_point)
+                    widths.append(width)
+
+            if widths[-1] != 1:
+                starts.append(last)
+                widths.append(1)
+
+        return starts, widths
+
+    def of(self, char: str) -> int:
+        if char < "\u0300":
+            return 1
+
+        if not self._starts:
+            self._build()
+
+        return self._widths[bisect_right(self._starts, ord(char)) - 1]
+
+
+_display_widths = _DisplayWidths()
+
+_WIDTH_MODES = ("chars", "display")
+
+
+def _check_width_mode(width_mode: str) -> None:
+    if width_mode not in _WIDTH_MODES:
+        raise ValueError(
+            f"Unknown width mode {width_mode!r}, expected one of "
+            f"{', '.join(_WIDTH_MODES)}"
+        )
+
+
+def _display_width(text: str) -> int:
+    if text.isascii():
+        return len(text)
+
+    return sum(map(_display_widths.of, text))
+
+
+def _display_columns(text: str) -> Union[list[int], None]:
+    """
+    Returns the value for _Paragraph.columns.
+    """
+    if text.isascii():
+        return None
+
+    widths = list(map(_display_widths.of, text))
+
+    if widths.count(1) == len(widths):
+        return None
+
+    return list(accumulate(widths, initial=0))
+
+
+def _to_display_indentation(
+    chunk: str, indentation: _LineIndentation
+) -> _LineIndentation:
+    if not chunk.isascii():
+        indentation.for_line = _display_width(chunk[: indentation.for_line])
+        indentation.for_next_line = _display_width(chunk[: indentation.for_next_line])
+
+    return indentation
+
+
+# CSI sequences, like the SGR sequences setting colors, and two character escape
+# sequences
+_ESCAPE_SEQUENCES = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|[@-Z\\-_])")
+
+
+def _remove_escapes(text: str) -> tuple[str, list[tuple[int, str]]]:
+    """
+    Returns the text without escape sequences, and the removed sequences with
+    the offsets in the returned text where they were.
+    """
+    parts: list[str] = []
+    escapes: list[tuple[int, str]] = []
+    position = 0
+    length = 0
+
+    for match in _ESCAPE_SEQUENCES.finditer(text):
+        parts.append(text[position : match.start()])
+        length += match.start() - position
+        escapes.append((length, match.group()))
+        position = match.end()
+
+    parts.append(text[position:])
+
+    return "".join(parts), escapes
+
+
+_EDGE_WHITESPACE = re.compile(
+    rf"^(?:\s|{_ESCAPE_SEQUENCES.pattern})+|(?:\s|{_ESCAPE_SEQUENCES.pattern})+$"
+)
+
+
+def _strip(text: str) -> str:
+    """
+    Like str.strip, but also strips the whitespace between escape sequences.
+    """
+    if "\x1b" not in text:
+        return text.strip()
+
+    return _EDGE_WHITESPACE.sub(
+        lambda match: "".join(_ESCAPE_SEQUENCES.findall(match.group())), text
+    )
+
+
+def _visible_width(text: str, display: bool) -> int:
+    if "\x1b" in text:
+        text = _remove_escapes(text)[0]
+
+    return _display_width(text) if display else len(text)
+
+
+_SGR_SEQUENCES = re.compile(r"\x1b\[([0-9;:]*)m")
+
+# The attribute set by each SGR parameter. Parameters not listed here are kept
+# until a full reset.
+_SGR_ATTRIBUTES = {
+    1: "bold",
+    2: "faint",
+    3: "italic",
+    4: "underline",
+    21: "underline",
+    5: "blink",
+    6: "blink",
+    7: "inverse",
+    8: "conceal",
+    9: "strike",
+    53: "overline",
+    38: "foreground",
+    48: "background",
+    58: "underline color",
+    **{code: "foreground" for code in (*range(30, 38), *range(90, 98))},
+    **{code: "background" for code in (*range(40, 48), *range(100, 108))},
+}
+
+# The attributes reset by each SGR parameter
+_SGR_RESETS = {
+    22: ("bold", "faint"),
+    23: ("italic",),
+    24: ("underline",),
+    25: ("blink",),
+    27: ("inverse",),
+    28: ("conceal",),
+    29: ("strike",),
+    39: ("foreground",),
+    49: ("background",),
+    55: ("overline",),
+    59: ("underline color",),
+}
+
+# The number of parameters following 38, 48 and 58, for each color format
+_SGR_COLOR_LENGTHS = {"5": 2, "2": 4}
+
+
+def _update_active_styles(active: dict[str, str], escape: str) -> None:
+    """
+    Updates the attributes in effect, and the parameters setting them, with the
+    escape sequence, if it's an SGR sequence.
+    """
+    match = _SGR_SEQUENCES.fullmatch(escape)
+
+    if match is None:
+        return
+
+    parameters = match.group(1).split(";")
+    i = 0
+
+    while i < len(parameters):
+        parameter = parameters[i]
+        code_text = parameter.split(":")[0]
+        code = int(code_text) if code_text else 0
+        i += 1
+
+        # Colors given with semicolons span the following parameters
+        if code in (38, 48, 58) and ":" not in parameter and i < len(parameters):
+            length = _SGR_COLOR_LENGTHS.get(parameters[i], 0)
+            parameter = ";".join(parameters[i - 1 : i + length])
+            i += length
+
+        if code == 0:
+            active.clear()
+        elif code in _SGR_RESETS or parameter == "4:0":
+            for attribute in _SGR_RESETS.get(code, ("underline",)):
+                active.pop(attribute, None)
+        else:
+            attribute = _SGR_ATTRIBUTES.get(code, parameter)
+            active.pop(attribute, None)
+            active[attribute] = parameter
+
+
+def _active_styles_sequence(active: dict[str, str]) -> str:
+    if not active:
+        return ""
+
+    return f"\x1b[{';'.join(active.values())}m"
+
+
+def _restore_escapes(p: _Paragraph, lines: list[str]) -> list[str]:
+    """
+    Inserts the escape sequences removed from the paragraph into its wrapped
+    lines. Each line after the first starts with the SGR sequences, that are
+    still in effect at the end of the previous line, combined into one.
+    """
+    if not p.escapes:
+        return lines
+
+    text = p.text
+    escapes = iter(p.escapes)
+    escape = next(escapes, None)
+    active: dict[str, str] = {}
+    restored: list[str] = []
+    end = 0
+
+    lines = lines or [""]
+
+    for i, line in enumerate(lines):
+        content = line.lstrip(" ")
+        is_last = i == len(lines) - 1
+
+        # The lines are consecutive slices of the text, with the whitespace
+        # between them stripped
+        start = end
+
+        while start < len(text) and text[start].isspace():
+            start += 1
+
+        end = start + len(content)
+        parts = [line[: len(line) - len(content)], _active_styles_sequence(active)]
+        position = start
+
+        # An escape right at the end of a line stays on it, unless the line is
+        # empty, since then the escape follows the whitespace before the next
+        while escape is not None and (
+            is_last or escape[0] < end or (escape[0] == end and content)
+        ):
+            offset = min(max(escape[0], start), end)
+            parts.append(text[position:offset])
+            parts.append(escape[1])
+            position = offset
+            _update_active_styles(active, escape[1])
+            escape = next(escapes, None)
+
+        parts.append(text[position:end])
+        restored.append("".join(parts))
+
+    return restored
 
 
 def wrap_paragraph(p: _Paragraph, width: int) -> list[str]:
     inhibitor = _BreakInhibitor()
     lines: list[str] = []
+    columns = p.columns
 
     start = 0
     last_break_opportunity = -1
@@ -153,7 +641,10 @@ def wrap_paragraph(p: _Paragraph, width: int) -> list[str]:
     for i, char in enumerate(p.text):
         indent = p.indentation.for_line if not lines else p.indentation.for_next_line
 
-        current_width = i - start + indent
+        # A wide character at i counts with all of its columns
+        current_width = (
+            i - start if columns is None else columns[i + 1] - 1 - columns[start]
+        ) + indent
         inhibitor.update(p.text, i)
 
         if current_width > width and last_break_opportunity != -1:
@@ -171,93 +662,1669 @@ def wrap_paragraph(p: _Paragraph, width: int) -> list[str]:
     return lines
 
 
-from typing import Union
+_WHITESPACE = re.compile(r"\s")
+_NON_SPACE_WHITESPACE = re.compile(r"[^\S ]")
+_QUOTE_CHARS = re.compile(r"[\"'`]")
 
 
-def terminal_wrap(text: str, width: Union[int, None] = None) -> str:
-    if width is None:
-        width = _get_terminal_columns(fallback=1000000)
+def _find_inhibited_spans(text: str) -> tuple[list[int], list[int]]:
+    """
+    Returns the start and end offsets of the spans, where _BreakInhibitor is
+    active.
 
-    blocks = process_multiline_verbatim_blocks(text)
-    blocks = process_multiple_newlines(blocks)
-    paragraphs: list[_Paragraph] = []
+    The inhibitor can only change state on a quote character, or on the
+    character following a single quote, so it is enough to replay it on those
+    positions.
+    """
+    events: set[int] = set()
 
-    for block in blocks:
-        if block.is_verbatim:
-            indent = _LineIndentation80(block.text)
-            indent.for_line += block.indentation
+    for match in _QUOTE_CHARS.finditer(text):
+        events.add(match.start())
 
-            paragraphs.append(_Paragraph(indent, block.text, True))
-            continue
+        if match.group() == "'":
+            events.add(match.start() + 1)
 
-        maybe_paragraphs: list[_Paragraph] = []
+    starts: list[int] = []
+    ends: list[int] = []
+    inhibitor = _BreakInhibitor()
+    active = False
 
-        for chunk in block.text.split("\n"):
-            maybe_paragraphs.append(
-                _Paragraph(_LineIndentation80(chunk), chunk.strip())
-            )
+    for i in sorted(events):
+        if i >= len(text):
+            break
 
-        for i, p in enumerate(maybe_paragraphs):
-            if i == 0 or (
-                not paragraphs
-                or paragraphs[-1].indentation.for_next_line != p.indentation.for_line
-            ):
-                paragraphs.append(p)
+        inhibitor.update(text, i)
+
+        if inhibitor.active() != active:
+            active = not active
+
+            if active:
+                starts.append(i)
             else:
-                paragraphs[-1].text += " " + p.text.strip()
+                ends.append(i)
 
-    lines: list[str] = []
+    if active:
+        ends.append(len(text))
 
-    for i, p in enumerate(paragraphs):
-        wrapped = (
-            wrap_paragraph(p, width)
-            if not p.is_verbatim
-            else [" " * p.indentation.for_line + p.text]
+    return starts, ends
+
+
+class _BreakOpportunities:
+    """
+    The whitespace positions of a paragraph, that are not inside a quoted span,
+    and hence are eligible for inserting a line break.
+    """
+
+    def __init__(self, text: str, collect_positions: bool = False):
+        self._text = text
+        self._inhibited_starts, self._inhibited_ends = (
+            _find_inhibited_spans(text)
+            if _QUOTE_CHARS.search(text) is not None
+            else ([], [])
         )
+        self._positions: Union[list[int], None] = None
 
-        if not wrapped:
-            wrapped = [""]
+        # When the only whitespace is the space character, str.find and
+        # str.rfind can be used directly, otherwise all positions are collected
+        # up front. Collected positions are cheaper to look up repeatedly.
+        if collect_positions or _NON_SPACE_WHITESPACE.search(text) is not None:
+            self._positions = [
+                m.start()
+                for m in _WHITESPACE.finditer(text)
+                if not self._is_inhibited(m.start())
+            ]
 
-        if i > 0 and paragraphs[i - 1].is_verbatim and not wrapped[0]:
-            wrapped[0] = lines[-1] + wrapped[0]
-            lines.pop()
+    def _inhibited_span(self, i: int) -> int:
+        k = bisect_right(self._inhibited_starts, i) - 1
 
-        if p.is_verbatim and lines and not lines[-1]:
-            wrapped[0] = lines[-1] + wrapped[0]
-            lines.pop()
+        if k >= 0 and i < self._inhibited_ends[k]:
+            return k
 
-        lines.extend(wrapped)
+        return -1
 
-    return "\n".join(lines)
+    def _is_inhibited(self, i: int) -> bool:
+        return self._inhibited_span(i) != -1
+
+    def last(self, lo: int, hi: int) -> int:
+        """
+        Returns the last break opportunity in [lo, hi], or -1.
+        """
+        if self._positions is not None:
+            k = bisect_right(self._positions, hi) - 1
+
+            if k >= 0 and self._positions[k] >= lo:
+                return self._positions[k]
+
+            return -1
+
+        while hi >= lo:
+            i = self._text.rfind(" ", lo, hi + 1)
+
+            if i == -1:
+                return -1
+
+            span = self._inhibited_span(i)
+
+            if span == -1:
+                return i
+
+            hi = self._inhibited_starts[span] - 1
+
+        return -1
 
+    def first(self, lo: int) -> int:
+        """
+        Returns the first break opportunity at or after lo, or -1.
+        """
+        if self._positions is not None:
+            k = bisect_right(self._positions, lo - 1)
 
-from argparse import HelpFormatter
+            if k < len(self._positions):
+                return self._positions[k]
 
+            return -1
 
-class BbmpHelpFormatter(HelpFormatter):
-    def _fill_text(self, text, width, indent):
-        return terminal_wrap(indent + text, width)
+        while True:
+            i = self._text.find(" ", lo)
 
+            if i == -1:
+                return -1
 
-import logging
+            span = self._inhibited_span(i)
 
+            if span == -1:
+                return i
 
-class BbmpLogFormatter(logging.Formatter):
-    def __init__(self, format: str, indent_message=False):
-        super().__init__(format)
-        self.indent_message = indent_message
+            lo = self._inhibited_ends[span]
 
-    def formatMessage(self, record):
-        formatted = super().formatMessage(record)
 
-        if self.indent_message:
-            formatted_in_parts = formatted.split(record.message)
+def wrap_paragraph_slices(
+    p: _Paragraph, width: int, breaks: Union[_BreakOpportunities, None] = None
+) -> list[str]:
+    """
+    Produces the same output as wrap_paragraph, but instead of visiting each
+    character, it jumps from one line break to the next using the precomputed
+    break opportunities.
+    """
+    text = p.text
+
+    if breaks is None:
+        breaks = _BreakOpportunities(text)
+
+    lines: list[str] = []
+
+    start = 0
+    lo = 0
+    indent = p.indentation.for_line
+
+    while True:
+        # The first index at which wrap_paragraph would find the line too wide
+        if p.columns is None:
+            trigger = start + width - indent + 1
+        else:
+            trigger = bisect_right(p.columns, p.columns[start] + width - indent + 1) - 1
+
+        if trigger >= len(text):
+            break
+
+        line_break = breaks.last(lo, trigger - 1)
+
+        if line_break == -1:
+            line_break = breaks.first(max(lo, trigger))
+
+            if line_break == -1 or line_break + 1 >= len(text):
+                break
+
+        lines.append(" " * indent + text[start:line_break].strip())
+        start = line_break
+        lo = line_break + 1
+        indent = p.indentation.for_next_line
+
+    if start < len(text):
+        lines.append(" " * indent + text[start:].strip())
+
+    return lines
+
+
+_WHITESPACE_RUNS = re.compile(r"(\s+)")
+
+
+def _words(text: str, breaks: _BreakOpportunities) -> tuple[list[int], list[int]]:
+    """
+    Returns the start and end offsets of the words of the text, i.e. the parts
+    between runs of whitespace where a line break can be inserted.
+    """
+    words = text.split(" ")
+
+    # The lengths of the parts, alternating between words and whitespace runs,
+    # whose running sum gives their offsets
+    if "" not in words and _NON_SPACE_WHITESPACE.search(text) is None:
+        lengths: Iterable[int] = chain.from_iterable(zip(map(len, words), repeat(1)))
+    else:
+        lengths = map(len, _WHITESPACE_RUNS.split(text))
+
+    offsets = list(accumulate(lengths, initial=0))
+    starts = offsets[0:-1:2]
+    ends = offsets[1::2]
+
+    if breaks._inhibited_starts:
+        # A run starting in a quoted span joins the words on either side of it
+        keep = [True] * len(ends)
+
+        for a, b in zip(breaks._inhibited_starts, breaks._inhibited_ends):
+            for k in range(bisect_left(ends, a), bisect_left(ends, b)):
+                keep[k] = False
+
+        starts[1:] = compress(starts[1:], keep)
+        ends = list(compress(ends, keep))
+
+    # Leading and trailing whitespace doesn't make a word
+    if ends[0] == 0:
+        del starts[0], ends[0]
+
+    if ends and starts[-1] == len(text):
+        del starts[-1], ends[-1]
+
+    return starts, ends
+
 
-            if formatted_in_parts:
-                indent = len(formatted_in_parts[0]) + 1
-                formatted = formatted_in_parts[0] + "\n".join(
-                    " " + l if i == 0 else " " * indent + l
-                    for i, l in enumerate(record.message.splitlines())
+def wrap_paragraph_optimal(p: _Paragraph, width: int) -> list[str]:
+    """
+    Breaks the paragraph at the same break opportunities as wrap_paragraph, but
+    instead of filling each line greedily, it minimizes the sum of the squares
+    of the unused columns at the end of each line but the last, which gives
+    more evenly filled lines.
+
+    Since this cost satisfies the quadrangle inequality, a later break is at
+    least as good a predecessor as an earlier one for every following break,
+    once it is better for one. The candidates are kept in a queue, each with the
+    range of breaks it is best for, and finding where a new candidate takes over
+    is a binary search within one line's worth of words. A paragraph of n words
+    with up to k words per line takes O(n log k) time, instead of the O(n^2) of
+    trying every earlier break.
+
+    A word wider than the line is put on a line of its own, like
+    wrap_paragraph does. Paragraphs that wrap_paragraph leaves on one line are
+    returned unchanged.
+    """
+    text = p.text
+    columns = p.columns
+    breaks = _BreakOpportunities(text)
+    first_limit = width - p.indentation.for_line
+    limit = width - p.indentation.for_next_line
+    starts, ends = _words(text, breaks)
+    n = len(starts)
+
+    fits_on_one_line = (
+        len(text) <= first_limit + 1
+        if columns is None
+        else columns[-1] - 1 <= first_limit
+    )
+
+    if n < 2 or fits_on_one_line or first_limit < 1 or limit < 1:
+        return wrap_paragraph_slices(p, width, breaks)
+
+    if columns is not None:
+        starts_x = [columns[i] for i in starts]
+        ends_x = [columns[i] for i in ends]
+    else:
+        starts_x = starts
+        ends_x = ends
+
+    # Lines after the first are measured with words wider than the limit
+    # counted as exactly the limit. That keeps them on a line of their own, with
+    # no cost, while the cost of all other lines stays a convex function of
+    # their width, which the quadrangle inequality relies on.
+    widths = map(min, map(sub, ends_x, starts_x), repeat(limit))
+    gaps = map(sub, starts_x[1:], ends_x)
+    edges = list(accumulate(chain.from_iterable(zip(widths, gaps)), initial=0))
+
+    # The last word has no gap after it, so its right edge is added separately
+    left = edges[0::2]
+    right = edges[1::2]
+    right.append(left[-1] + min(ends_x[-1] - starts_x[-1], limit))
+
+    # reach[i] is the first break, at which the line starting with word i is too
+    # wide. The line always fits its own first word, since it is clamped.
+    widest = map(bisect_right, repeat(right), map(add, left, repeat(limit)))
+    reach = list(map(min, map(add, widest, repeat(1)), repeat(n)))
+
+    # The first line is measured without clamping, since it has its own limit.
+    # It fits up to break first_reach.
+    first_reach = bisect_right(ends_x, starts_x[0] + first_limit)
+
+    # best[j] is the least cost of breaking before word j, and previous[j] the
+    # break before that one
+    best = [0] * n
+    previous = [0] * n
+
+    # Each candidate is the best predecessor from its start up to the start of
+    # the next one
+    candidates: list[int] = []
+    candidate_starts: list[int] = []
+    head = 0
+
+    for j in range(1, n):
+        while head + 1 < len(candidates) and candidate_starts[head + 1] <= j:
+            head += 1
+
+        previous_j = 0
+
+        if j <= first_reach:
+            slack = first_limit - (ends_x[j - 1] - starts_x[0])
+            best_j = slack * slack
+        elif j == 1:
+            best_j = 0
+        else:
+            # The first line can't end here
+            best_j = -1
+
+        if head < len(candidates):
+            i = candidates[head]
+
+            if j < reach[i]:
+                slack = limit - (right[j - 1] - left[i])
+                value = best[i] + slack * slack
+
+                if best_j == -1 or value < best_j:
+                    best_j = value
+                    previous_j = i
+
+        best[j] = best_j
+        previous[j] = previous_j
+
+        if j + 1 >= n:
+            continue
+
+        # Find from which break on j is a better predecessor than the candidates
+        # already queued. Where a candidate's line fits, j's line fits too.
+        left_j = left[j]
+
+        while head < len(candidates):
+            i = candidates[-1]
+            lo = max(candidate_starts[-1], j + 1)
+            hi = reach[i]
+
+            if lo < hi:
+                best_i = best[i]
+                left_i = left[i]
+                end = right[lo - 1]
+                slack_j = limit - (end - left_j)
+                slack_i = limit - (end - left_i)
+
+            if lo >= hi or best_j + slack_j * slack_j <= best_i + slack_i * slack_i:
+                candidates.pop()
+                candidate_starts.pop()
+                continue
+
+            while lo + 1 < hi:
+                mid = (lo + hi) // 2
+                end = right[mid - 1]
+                slack_j = limit - (end - left_j)
+                slack_i = limit - (end - left_i)
+
+                if best_j + slack_j * slack_j <= best_i + slack_i * slack_i:
+                    hi = mid
+                else:
+                    lo = mid
+
+            if hi < n:
+                candidates.append(j)
+                candidate_starts.append(hi)
+
+            break
+        else:
+            candidates.append(j)
+            candidate_starts.append(j + 1)
+
+    # The last line has no cost, as long as it fits
+    last = n - 1
+
+    for i in range(n - 2, 0, -1):
+        if right[n - 1] - left[i] > limit:
+            break
+
+        if best[i] <= best[last]:
+            last = i
+
+    line_starts = [last]
+
+    while line_starts[-1] != 0:
+        line_starts.append(previous[line_starts[-1]])
+
+    line_starts.reverse()
+    lines = []
+
+    for i, j in zip(line_starts, line_starts[1:] + [n]):
+        indent = p.indentation.for_line if i == 0 else p.indentation.for_next_line
+        lines.append(" " * indent + text[starts[i] : ends[j - 1]])
+
+    return lines
+
+
+import contextlib
+import threading
+
+
+class WrapProfile:
+    """
+    Statistics of the stages of terminal_wrap, collected while the profile is
+    active, see profile_stages(). For each stage the number of calls, the total
+    time in seconds, and the total input and output sizes are recorded.
+
+    The stages, and the units of their input and output sizes are:
+      "verbatim_blocks": splitting the text at ``` fences, characters to blocks.
+      "newlines":        splitting the blocks at blank lines, blocks to blocks.
+      "paragraphs":      merging the lines of blocks, blocks to paragraphs.
+      "wrap":            wrapping a paragraph, characters to lines.
+      "join":            joining the wrapped lines, lines to characters.
+
+    Paragraphs wrapped in worker processes are not recorded.
+    """
+
+    STAGES = ("verbatim_blocks", "newlines", "paragraphs", "wrap", "join")
+
+    def __init__(self) -> None:
+        self._stats: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def run(self, stage: str, input_size: int, function: Callable, *args):
+        """
+        Calls the function with the arguments, and records the call for the
+        stage. The output size is the len() of the result.
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        self.record(stage, time.perf_counter() - start, input_size, len(result))
+
+        return result
+
+    def record(
+        self, stage: str, seconds: float, input_size: int, output_size: int
+    ) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(stage, [0, 0.0, 0, 0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] += input_size
+            stats[3] += output_size
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def as_dict(self) -> dict[str, dict[str, float]]:
+        """
+        Returns the statistics of each stage that was called, e.g. for dumping
+        them as JSON.
+        """
+        with self._lock:
+            return {
+                stage: dict(
+                    zip(("calls", "seconds", "input_size", "output_size"), stats)
                 )
+                for stage, stats in self._stats.items()
+            }
+
+    def report(self) -> str:
+        """
+        Returns the statistics as a table.
+        """
+        lines = [
+            f"{'stage':<16}{'calls':>10}{'total ms':>12}{'mean us':>10}"
+            f"{'input':>12}{'output':>12}"
+        ]
+
+        for stage, stats in self.as_dict().items():
+            lines.append(
+                f"{stage:<16}{stats['calls']:>10}{stats['seconds'] * 1000:>12.3f}"
+                f"{stats['seconds'] / stats['calls'] * 1e6:>10.2f}"
+                f"{stats['input_size']:>12}{stats['output_size']:>12}"
+            )
+
+        return "\n".join(lines)
+
+
+# Checked once per call of terminal_wrap, so that the stages cost nothing extra
+# while no profile is active
+_stage_profile: Union[WrapProfile, None] = None
+
+
+@contextlib.contextmanager
+def profile_stages(profile: Union[WrapProfile, None] = None) -> Iterator[WrapProfile]:
+    """
+    Records the stages of all terminal_wrap calls in the process, on any thread,
+    into the profile, or a new one, until the context exits.
+    """
+    global _stage_profile
+
+    if profile is None:
+        profile = WrapProfile()
+
+    previous = _stage_profile
+    _stage_profile = profile
+
+    try:
+        yield profile
+    finally:
+        _stage_profile = previous
+
+
+def _profiled_wrap(
+    wrap: Callable[[_Paragraph, int], list[str]],
+) -> Callable[[_Paragraph, int], list[str]]:
+    def profiled(p: _Paragraph, width: int) -> list[str]:
+        profile = _stage_profile
+
+        if profile is None:
+            return wrap(p, width)
+
+        return profile.run("wrap", len(p.text), wrap, p, width)
+
+    return profiled
+
+
+_WRAP_ENGINES: dict[str, Callable[[_Paragraph, int], list[str]]] = {
+    "chars": wrap_paragraph,
+    "slices": wrap_paragraph_slices,
+    "optimal": wrap_paragraph_optimal,
+}
+
+
+def _get_wrap_engine(engine: str) -> Callable[[_Paragraph, int], list[str]]:
+    if engine not in _WRAP_ENGINES:
+        raise ValueError(
+            f"Unknown engine {engine!r}, expected one of {', '.join(_WRAP_ENGINES)}"
+        )
+
+    if _stage_profile is not None:
+        return _profiled_wrap(_WRAP_ENGINES[engine])
+
+    return _WRAP_ENGINES[engine]
+
+
+def _verbatim_paragraph(text: str, indentation: int) -> _Paragraph:
+    indent = _LineIndentation(text)
+    indent.for_line += indentation
+
+    return _Paragraph(indent, text, True)
+
+
+class _LineAssembler:
+    """
+    Concatenates the wrapped lines of consecutive paragraphs, dropping the empty
+    lines adjacent to verbatim blocks.
+
+    Only the last two lines can be affected by the next paragraph, all earlier
+    lines are returned by add() as soon as they are final.
+    """
+
+    def __init__(self) -> None:
+        self._lines: list[str] = []
+        self._previous_is_verbatim = False
+
+    def add(self, p: _Paragraph, wrapped: list[str]) -> list[str]:
+        lines = self._lines
+
+        if not wrapped:
+            wrapped = [""]
+
+        if self._previous_is_verbatim and not wrapped[0]:
+            wrapped[0] = lines[-1] + wrapped[0]
+            lines.pop()
+
+        if p.is_verbatim and lines and not lines[-1]:
+            wrapped[0] = lines[-1] + wrapped[0]
+            lines.pop()
+
+        lines.extend(wrapped)
+        self._previous_is_verbatim = p.is_verbatim
+
+        if len(lines) <= 2:
+            return []
+
+        final = lines[:-2]
+        del lines[:-2]
+
+        return final
+
+    def finish(self) -> list[str]:
+        final = self._lines
+        self._lines = []
+
+        return final
+
+
+def _wrap_and_assemble(
+    p: _Paragraph,
+    width: int,
+    wrap: Callable[[_Paragraph, int], list[str]],
+    assembler: _LineAssembler,
+) -> list[str]:
+    return assembler.add(p, _wrap_one(p, width, wrap))
+
+
+def _wrap_one(
+    p: _Paragraph, width: int, wrap: Callable[[_Paragraph, int], list[str]]
+) -> list[str]:
+    if p.is_verbatim:
+        return [" " * p.indentation.for_line + p.text]
+
+    return _restore_escapes(p, wrap(p, width))
+
+
+def terminal_wrap(
+    text: str,
+    width: Union[int, None] = None,
+    engine: str = "slices",
+    workers: int = 1,
+    width_mode: str = "chars",
+) -> str:
+    """
+    Wraps the text to the given width, or the width of the terminal if it's
+    None.
+
+    The engine can be "slices" (the default), or "chars", which is the
+    reference implementation visiting each character one by one. Both produce
+    identical output. The engine "optimal" breaks the same paragraphs at the
+    same places, but chooses the breaks so that the lines are filled evenly,
+    see wrap_paragraph_optimal.
+
+    With more than one worker, the paragraphs of texts longer than
+    PARALLEL_THRESHOLD characters are wrapped in a process pool.
+
+    The width_mode "chars" counts each character as one column. With "display",
+    East Asian wide characters count as two columns, and combining marks as
+    zero.
+
+    ANSI escape sequences have no width in either mode. When a line break is
+    inserted while an SGR style is in effect, the next line starts with the
+    sequences setting it again.
+    """
+    wrap = _get_wrap_engine(engine)
+    _check_width_mode(width_mode)
+
+    if width is None:
+        width = _get_terminal_columns(fallback=1000000)
+
+    paragraphs = _parse_paragraphs(text, width_mode)
+
+    if workers > 1 and len(text) >= PARALLEL_THRESHOLD:
+        return _wrap_paragraphs_parallel(paragraphs, width, engine, workers)
+
+    profile = _stage_profile
+
+    if profile is not None:
+        lines = list(_wrapped_lines(paragraphs, width, wrap))
+
+        return profile.run("join", len(lines), "\n".join, lines)
+
+    return "\n".join(_wrapped_lines(paragraphs, width, wrap))
+
+
+def _wrapped_lines(
+    paragraphs: Iterable[_Paragraph],
+    width: int,
+    wrap: Callable[[_Paragraph, int], list[str]],
+) -> Iterator[str]:
+    assembler = _LineAssembler()
+
+    for p in paragraphs:
+        yield from _wrap_and_assemble(p, width, wrap, assembler)
+
+    yield from assembler.finish()
+
+
+class _SupportsWrite(Protocol):
+    def write(self, s: str, /) -> object: ...
+
+
+def _write_lines(lines: Iterable[str], sink: _SupportsWrite) -> None:
+    """
+    Writes the lines separated by newlines.
+    """
+    for i, line in enumerate(lines):
+        if i > 0:
+            sink.write("\n")
+
+        if line:
+            sink.write(line)
+
+
+def terminal_wrap_into(
+    text: str,
+    width: Union[int, None],
+    sink: _SupportsWrite,
+    engine: str = "slices",
+    width_mode: str = "chars",
+) -> None:
+    """
+    Writes the same text to the sink, e.g. a stream or io.StringIO, that
+    terminal_wrap would return, but line by line, without joining the lines
+    into a single string first.
+
+    Each line, and each newline is a separate write. On a line buffered sink,
+    like sys.stderr, every newline is a flush, so writing the result of
+    terminal_wrap at once is faster there.
+    """
+    wrap = _get_wrap_engine(engine)
+    _check_width_mode(width_mode)
+
+    if width is None:
+        width = _get_terminal_columns(fallback=1000000)
+
+    _write_lines(_wrapped_lines(_parse_paragraphs(text, width_mode), width, wrap), sink)
+
+
+class _ParagraphBuilder:
+    """
+    Merges consecutive lines of a block into paragraphs, one line at a time.
+    The lines of a paragraph are only joined once it's complete, so building a
+    long paragraph takes linear time.
+    """
+
+    def __init__(self, width_mode: str = "chars") -> None:
+        self._display = width_mode == "display"
+        self._indentation: Union[_LineIndentation, None] = None
+        self._parts: list[str] = []
+
+    def add(self, chunk: str) -> Union[_Paragraph, None]:
+        """
+        Adds the next line, and returns the previous paragraph if this line
+        can't be merged into it.
+        """
+        visible = _remove_escapes(chunk)[0] if "\x1b" in chunk else chunk
+        indentation = _LineIndentation(visible)
+
+        if self._display:
+            indentation = _to_display_indentation(visible, indentation)
+
+        if (
+            self._indentation is not None
+            and self._indentation.for_next_line == indentation.for_line
+        ):
+            self._parts.append(_strip(chunk))
+            return None
+
+        completed = self.finish()
+        self._indentation = indentation
+        self._parts = [_strip(chunk)]
+
+        return completed
+
+    def finish(self) -> Union[_Paragraph, None]:
+        if self._indentation is None:
+            return None
+
+        p = _Paragraph(self._indentation, " ".join(self._parts))
+
+        if "\x1b" in p.text:
+            p.text, p.escapes = _remove_escapes(p.text)
+
+        if self._display:
+            p.columns = _display_columns(p.text)
+
+        self._indentation = None
+        self._parts = []
+
+        return p
+
+
+def _parse_paragraphs(text: str, width_mode: str = "chars") -> list[_Paragraph]:
+    profile = _stage_profile
+
+    if profile is None:
+        blocks = process_multiline_verbatim_blocks(text)
+        blocks = process_multiple_newlines(text, blocks)
+
+        return _merge_lines(text, blocks, width_mode)
+
+    blocks = profile.run(
+        "verbatim_blocks", len(text), process_multiline_verbatim_blocks, text
+    )
+    blocks = profile.run(
+        "newlines", len(blocks), process_multiple_newlines, text, blocks
+    )
+
+    return profile.run(
+        "paragraphs", len(blocks), _merge_lines, text, blocks, width_mode
+    )
+
+
+def _merge_lines(
+    text: str, blocks: list[_Block], width_mode: str = "chars"
+) -> list[_Paragraph]:
+    paragraphs: list[_Paragraph] = []
+
+    for block in blocks:
+        if block.is_verbatim:
+            paragraphs.append(
+                _verbatim_paragraph(text[block.start : block.end], block.indentation)
+            )
+            continue
+
+        builder = _ParagraphBuilder(width_mode)
+        start = block.start
+
+        while True:
+            end = text.find("\n", start, block.end)
+            p = builder.add(text[start : block.end if end == -1 else end])
+
+            if p is not None:
+                paragraphs.append(p)
+
+            if end == -1:
+                break
+
+            start = end + 1
+
+        p = builder.finish()
+
+        if p is not None:
+            paragraphs.append(p)
+
+    return paragraphs
+
+
+class WrapDocument:
+    """
+    Text parsed into paragraphs once, that can then be rendered at any width
+    with the same result as terminal_wrap.
+
+    The break opportunities of each paragraph are also computed up front, so
+    rendering only has to find the line breaks.
+    """
+
+    def __init__(self, text: str, width_mode: str = "chars"):
+        _check_width_mode(width_mode)
+        self._paragraphs = _parse_paragraphs(text, width_mode)
+        self._breaks = [
+            _BreakOpportunities(p.text, collect_positions=True)
+            for p in self._paragraphs
+            if not p.is_verbatim
+        ]
+
+    def render(self, width: Union[int, None] = None) -> str:
+        if width is None:
+            width = _get_terminal_columns(fallback=1000000)
+
+        breaks = iter(self._breaks)
+        assembler = _LineAssembler()
+        lines: list[str] = []
+
+        for p in self._paragraphs:
+            wrapped = (
+                _restore_escapes(p, wrap_paragraph_slices(p, width, next(breaks)))
+                if not p.is_verbatim
+                else [" " * p.indentation.for_line + p.text]
+            )
+            lines.extend(assembler.add(p, wrapped))
+
+        lines.extend(assembler.finish())
+
+        return "\n".join(lines)
+
+
+_STREAM_TOKENS = re.compile(r"```|\n+")
+
+
+class _StreamParser:
+    """
+    Incrementally splits text into the same paragraphs that terminal_wrap
+    produces for the concatenation of all chunks fed to it.
+
+    Text is held only until the paragraph containing it is complete. The
+    unresolved state carried between chunks is: an open verbatim block, up to
+    two trailing backticks that may start a fence, a run of newlines that may
+    continue, the current line, and the whitespace-only lines at the end of
+    the current block, which are dropped if the block ends there.
+    """
+
+    def __init__(self, width_mode: str = "chars") -> None:
+        self._completed: list[_Paragraph] = []
+        self._backticks = ""
+        self._in_verbatim = False
+        self._verbatim_parts: list[str] = []
+        self._verbatim_indentation = 0
+
+        self._newlines = 0
+        self._line_parts: list[str] = []
+        self._segment_has_text = False
+        self._pending_line: Union[str, None] = None
+        self._blank_lines: list[str] = []
+        self._builder = _ParagraphBuilder(width_mode)
+
+    def feed(self, chunk: str) -> list[_Paragraph]:
+        """
+        Returns the paragraphs completed by this chunk.
+        """
+        text = self._backticks + chunk
+        self._backticks = ""
+        position = 0
+
+        for match in _STREAM_TOKENS.finditer(text):
+            if match.start() > position:
+                self._add_text(text[position : match.start()])
+
+            if match.group() == "```":
+                self._toggle_verbatim()
+            elif self._in_verbatim:
+                self._verbatim_parts.append(match.group())
+            else:
+                self._newlines += len(match.group())
+
+            position = match.end()
+
+        remainder = text[position:]
+        stripped = remainder.rstrip("`")
+        self._backticks = remainder[len(stripped) :]
+
+        if stripped:
+            self._add_text(stripped)
+
+        return self._take_completed()
+
+    def close(self) -> list[_Paragraph]:
+        """
+        Returns the remaining paragraphs at the end of the input.
+        """
+        if self._backticks:
+            self._add_text(self._backticks)
+            self._backticks = ""
+
+        if self._in_verbatim:
+            self._end_verbatim()
+        else:
+            self._end_segment()
+
+        return self._take_completed()
+
+    def _take_completed(self) -> list[_Paragraph]:
+        completed = self._completed
+        self._completed = []
+
+        return completed
+
+    def _add_text(self, text: str) -> None:
+        if self._in_verbatim:
+            self._verbatim_parts.append(text)
+            return
+
+        self._resolve_newlines()
+        self._line_parts.append(text)
+        self._segment_has_text = True
+
+    def _toggle_verbatim(self) -> None:
+        if self._in_verbatim:
+            self._end_verbatim()
+            return
+
+        self._end_segment()
+        self._in_verbatim = True
+
+    def _end_verbatim(self) -> None:
+        text = "".join(self._verbatim_parts)
+        self._completed.append(_verbatim_paragraph(text, self._verbatim_indentation))
+        self._verbatim_parts = []
+        self._in_verbatim = False
+
+    def _end_segment(self) -> None:
+        self._resolve_newlines()
+
+        last_line = "".join(self._line_parts)
+        self._verbatim_indentation = len(last_line) - len(last_line.rstrip(" "))
+
+        if self._segment_has_text:
+            self._end_line()
+            self._end_block()
+
+        self._line_parts = []
+        self._segment_has_text = False
+
+    def _resolve_newlines(self) -> None:
+        if self._newlines == 0:
+            return
+
+        newlines = self._newlines
+        self._newlines = 0
+        self._end_line()
+
+        if newlines == 1:
+            self._segment_has_text = True
+            return
+
+        self._end_block()
+
+        for _ in range(1, newlines):
+            self._completed.append(_Paragraph(_LineIndentation(""), ""))
+
+        self._segment_has_text = False
+
+    def _end_line(self) -> None:
+        line = "".join(self._line_parts)
+        self._line_parts = []
+
+        if not line.strip():
+            self._blank_lines.append(line)
+            return
+
+        if self._pending_line is not None:
+            self._add_paragraph(self._builder.add(self._pending_line))
+
+        for blank_line in self._blank_lines:
+            self._add_paragraph(self._builder.add(blank_line))
+
+        self._blank_lines = []
+        self._pending_line = line
+
+    def _end_block(self) -> None:
+        last_line = self._pending_line.rstrip() if self._pending_line else ""
+        self._add_paragraph(self._builder.add(last_line))
+        self._add_paragraph(self._builder.finish())
+        self._pending_line = None
+        self._blank_lines = []
+
+    def _add_paragraph(self, p: Union[_Paragraph, None]) -> None:
+        if p is not None:
+            self._completed.append(p)
+
+
+def terminal_wrap_stream(
+    chunks: Iterable[str],
+    width: Union[int, None] = None,
+    engine: str = "slices",
+    width_mode: str = "chars",
+) -> Iterator[str]:
+    """
+    Wraps text arriving in chunks, yielding each wrapped line as soon as it is
+    final. Joining the yielded lines with "\\n" gives the same result as calling
+    terminal_wrap on the concatenated chunks.
+    """
+    wrap = _get_wrap_engine(engine)
+    _check_width_mode(width_mode)
+
+    if width is None:
+        width = _get_terminal_columns(fallback=1000000)
+
+    parser = _StreamParser(width_mode)
+    assembler = _LineAssembler()
+
+    for chunk in chunks:
+        for p in parser.feed(chunk):
+            yield from _wrap_and_assemble(p, width, wrap, assembler)
+
+    for p in parser.close():
+        yield from _wrap_and_assemble(p, width, wrap, assembler)
+
+    yield from assembler.finish()
+
+
+import copy
+
+
+def _assemble(
+    paragraphs: Iterable[_Paragraph],
+    width: int,
+    wrap: Callable[[_Paragraph, int], list[str]],
+) -> list[str]:
+    # Verbatim paragraphs are yielded as a single string with newlines in it
+    return [
+        line
+        for lines in _wrapped_lines(paragraphs, width, wrap)
+        for line in lines.split("\n")
+    ]
+
+
+class IncrementalWrapper:
+    """
+    Holds a growing text, and its lines wrapped with the same result as
+    terminal_wrap, e.g. for a scrolling log pane.
+
+    Appending only parses and wraps the new text, and the last, still open
+    paragraph. Changing the width doesn't wrap anything, until lines are
+    requested. Then only as many paragraphs are wrapped, as needed to produce
+    the requested lines, counting from the start or, for negative indices, from
+    the end.
+    """
+
+    def __init__(
+        self,
+        width: Union[int, None] = None,
+        engine: str = "slices",
+        width_mode: str = "chars",
+    ):
+        _check_width_mode(width_mode)
+        self._wrap = _get_wrap_engine(engine)
+        self._width = width
+        self._parser = _StreamParser(width_mode)
+        self._paragraphs: list[_Paragraph] = []
+
+        # The paragraphs are split into segments, where neither the last
+        # paragraph of a segment, nor the first of the next one is verbatim, and
+        # the first one isn't empty.
+        # The wrapped lines of a segment then don't depend on the neighboring
+        # segments, and can be cached.
+        self._segment_starts: list[int] = []
+        self._segment_lines: list[Union[list[str], None]] = []
+        self._segment_widths: list[int] = []
+
+    def set_width(self, width: Union[int, None]) -> None:
+        """
+        Sets the wrap width, or the width of the terminal if it's None.
+        """
+        self._width = width
+
+    def append(self, text: str) -> None:
+        for p in self._parser.feed(text):
+            if self._joins_last_segment(p):
+                self._segment_lines[-1] = None
+            else:
+                self._segment_starts.append(len(self._paragraphs))
+                self._segment_lines.append(None)
+                self._segment_widths.append(0)
+
+            self._paragraphs.append(p)
+
+    def lines(
+        self, start: Union[int, None] = None, stop: Union[int, None] = None
+    ) -> list[str]:
+        """
+        Returns the wrapped lines in the range, which is interpreted like a
+        slice of text().split("\\n").
+        """
+        width = self._get_width()
+        tail, num_segments = self._tail_lines(width)
+
+        if num_segments == 0 and not tail:
+            # Like "".split("\n")
+            return [""][start:stop]
+
+        if (start is not None and start < 0) and (stop is None or stop < 0):
+            # Only the segments covering the last -start lines are wrapped
+            collected = [tail]
+            num_lines = len(tail)
+
+            for i in range(num_segments - 1, -1, -1):
+                if num_lines >= -start:
+                    break
+
+                collected.append(self._get_segment_lines(i, width))
+                num_lines += len(collected[-1])
+
+            return [l for lines in reversed(collected) for l in lines][start:stop]
+
+        if (start is None or start >= 0) and (stop is not None and stop >= 0):
+            collected = []
+            num_lines = 0
+
+            for i in range(num_segments):
+                if num_lines >= stop:
+                    break
+
+                collected.append(self._get_segment_lines(i, width))
+                num_lines += len(collected[-1])
+
+            collected.append(tail)
+
+            return [l for lines in collected for l in lines][start:stop]
+
+        return self._all_lines(width)[start:stop]
+
+    def text(self) -> str:
+        """
+        Returns the same result as terminal_wrap on the text appended so far.
+        """
+        return "\n".join(self._all_lines(self._get_width()))
+
+    def _get_width(self) -> int:
+        if self._width is None:
+            return _get_terminal_columns(fallback=1000000)
+
+        return self._width
+
+    def _joins_last_segment(self, p: _Paragraph) -> bool:
+        # An empty paragraph stays in the segment before it, since a verbatim
+        # paragraph after it can join its empty line, and then the empty line
+        # before that
+        return bool(self._paragraphs) and (
+            p.is_verbatim or self._paragraphs[-1].is_verbatim or not p.text.strip()
+        )
+
+    def _get_segment_lines(self, i: int, width: int) -> list[str]:
+        lines = self._segment_lines[i]
+
+        if lines is None or self._segment_widths[i] != width:
+            end = (
+                self._segment_starts[i + 1]
+                if i + 1 < len(self._segment_starts)
+                else len(self._paragraphs)
+            )
+            lines = _assemble(
+                self._paragraphs[self._segment_starts[i] : end], width, self._wrap
+            )
+            self._segment_lines[i] = lines
+            self._segment_widths[i] = width
+
+        return lines
+
+    def _tail_lines(self, width: int) -> tuple[list[str], int]:
+        """
+        Returns the lines of the paragraphs still open in the parser, together
+        with the last segment if they can't be wrapped separately, and the
+        number of segments that aren't included.
+        """
+        open_paragraphs = copy.deepcopy(self._parser).close()
+        num_segments = len(self._segment_starts)
+
+        if not open_paragraphs:
+            return [], num_segments
+
+        if self._joins_last_segment(open_paragraphs[0]):
+            num_segments -= 1
+            open_paragraphs = (
+                self._paragraphs[self._segment_starts[-1] :] + open_paragraphs
+            )
+
+        return _assemble(open_paragraphs, width, self._wrap), num_segments
+
+    def _all_lines(self, width: int) -> list[str]:
+        tail, num_segments = self._tail_lines(width)
+        lines: list[str] = []
+
+        for i in range(num_segments):
+            lines.extend(self._get_segment_lines(i, width))
+
+        lines.extend(tail)
+
+        return lines or [""]
+
+
+import io
+from typing import TextIO
+
+
+class WrappingTextIO(io.TextIOBase):
+    """
+    A text stream that wraps the text written to it with the same rules as
+    terminal_wrap, and writes the result to another stream, e.g. for wrapping
+    the output of a whole program with sys.stdout = WrappingTextIO(sys.stdout).
+
+    Text is held until the paragraph containing it is complete, and the wrapped
+    lines are written to the stream in batches of about buffer_size characters,
+    or on flush(). Unlike terminal_wrap, a final newline is kept, so writing
+    "a\\n" and closing writes "a\\n".
+
+    Since consecutive lines are joined into a paragraph, a line isn't written
+    until the paragraph ends. With flush_on_newline, the text is wrapped as if
+    the output ended there whenever a write ends with a newline outside a
+    verbatim block, and written immediately. With flush_timeout, the same
+    happens from a timer thread, when text has been held for that many seconds,
+    even in the middle of a line. Either way each line becomes a paragraph of
+    its own.
+
+    Closing writes the remaining text, but doesn't close the stream.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO,
+        width: Union[int, None] = None,
+        engine: str = "slices",
+        width_mode: str = "chars",
+        flush_on_newline: bool = False,
+        flush_timeout: Union[float, None] = None,
+        buffer_size: int = 64 * 1024,
+    ):
+        super().__init__()
+        _check_width_mode(width_mode)
+        self._wrap = _get_wrap_engine(engine)
+        self._stream = stream
+        self._width = width
+        self._width_mode = width_mode
+        self.flush_on_newline = flush_on_newline
+        self.flush_timeout = flush_timeout
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()
+        self._timer: Union[threading.Timer, None] = None
+
+        # Writes are only collected, and parsed in batches, since parsing each
+        # one separately would cost more than wrapping the text
+        self._input: list[str] = []
+        self._input_size = 0
+
+        # The text since the last forced flush is wrapped as a unit, as if it
+        # were passed to terminal_wrap
+        self._parser = _StreamParser(width_mode)
+        self._assembler = _LineAssembler()
+        self._unit_has_lines = False
+        self._unit_ends_with_newline = False
+
+        self._output: list[str] = []
+        self._output_size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return self._stream.isatty()
+
+    @property
+    def encoding(self) -> str:  # type: ignore[override]
+        return self._stream.encoding
+
+    @property
+    def errors(self) -> Union[str, None]:  # type: ignore[override]
+        return self._stream.errors
+
+    def fileno(self) -> int:
+        """
+        Returns the file descriptor of the stream. Writing to it directly skips
+        the wrapping, and the text still held.
+        """
+        return self._stream.fileno()
+
+    def write(self, s: str) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+
+        if not isinstance(s, str):
+            raise TypeError(f"write() argument must be str, not {type(s).__name__}")
+
+        if not s:
+            return 0
+
+        with self._lock:
+            self._input.append(s)
+            self._input_size += len(s)
+
+            if self.flush_on_newline and s[-1] == "\n":
+                self._parse_input()
+
+                if self._at_line_end():
+                    self._end_unit()
+                    self._write_output()
+                    self._stream.flush()
+            elif self._input_size >= self.buffer_size:
+                self._parse_input()
+
+                if self._output_size >= self.buffer_size:
+                    self._write_output()
+
+            self._start_timer()
+
+        return len(s)
+
+    def flush(self) -> None:
+        """
+        Writes the lines that are complete, and flushes the stream. The
+        paragraph still being written is held.
+        """
+        if self.closed:
+            return
+
+        with self._lock:
+            self._parse_input()
+            self._write_output()
+
+        # The stream may be closed before this, with nothing left to write
+        if not self._stream.closed:
+            self._stream.flush()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            self._end_unit()
+
+        super().close()
+
+    def _get_width(self) -> int:
+        if self._width is None:
+            return _get_terminal_columns(fallback=1000000)
+
+        return self._width
+
+    def _at_line_end(self) -> bool:
+        return not self._parser._in_verbatim and not self._parser._backticks
+
+    def _add_lines(self, lines: list[str]) -> None:
+        if not lines:
+            return
+
+        text = "\n".join(lines)
+
+        if self._unit_has_lines:
+            text = "\n" + text
+
+        self._unit_has_lines = True
+        self._output.append(text)
+        self._output_size += len(text)
+
+    def _parse_input(self) -> None:
+        if not self._input:
+            return
+
+        text = "".join(self._input)
+        self._input = []
+        self._input_size = 0
+        self._unit_ends_with_newline = text[-1] == "\n"
+        width = self._get_width()
+
+        for p in self._parser.feed(text):
+            self._add_lines(_wrap_and_assemble(p, width, self._wrap, self._assembler))
+
+    def _end_unit(self) -> None:
+        self._parse_input()
+        width = self._get_width()
+        # A newline inside a verbatim block is part of it already
+        final_newline = self._unit_ends_with_newline and self._at_line_end()
+
+        for p in self._parser.close():
+            self._add_lines(_wrap_and_assemble(p, width, self._wrap, self._assembler))
+
+        self._add_lines(self._assembler.finish())
+
+        if final_newline:
+            self._output.append("\n")
+            self._output_size += 1
+
+        self._parser = _StreamParser(self._width_mode)
+        self._assembler = _LineAssembler()
+        self._unit_has_lines = False
+        self._unit_ends_with_newline = False
+
+    def _write_output(self) -> None:
+        if self._output:
+            self._stream.write("".join(self._output))
+            self._output = []
+            self._output_size = 0
+
+    def _start_timer(self) -> None:
+        if self.flush_timeout is None or self._timer is not None:
+            return
+
+        self._timer = threading.Timer(self.flush_timeout, self._flush_held_text)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_held_text(self) -> None:
+        with self._lock:
+            self._timer = None
+
+            if self.closed:
+                return
+
+            self._end_unit()
+            self._write_output()
+
+        self._stream.flush()
+
+
+import functools
+
+# Below this many characters of input, the parallel code paths wrap serially,
+# because starting the process pool would take longer than the wrapping.
+PARALLEL_THRESHOLD = 256 * 1024
+
+
+def _split_into_batches(items: list, sizes: list[int], workers: int) -> list[list]:
+    """
+    Splits the items into contiguous batches of roughly equal total size. Each
+    worker gets a few batches, so that they stay busy even if some batches take
+    longer than others.
+    """
+    batch_size = max(1, sum(sizes) // (workers * 4))
+    batches: list[list] = []
+    batch: list = []
+    batch_total = 0
+
+    for item, size in zip(items, sizes):
+        batch.append(item)
+        batch_total += size
+
+        if batch_total >= batch_size:
+            batches.append(batch)
+            batch = []
+            batch_total = 0
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+def _map_batches(function: Callable[[list], list], batches: list[list], workers: int):
+    # Imported here, because it imports logging, which is slow to import
+    import concurrent.futures
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        return [
+            result for results in executor.map(function, batches) for result in results
+        ]
+
+
+def _wrap_paragraph_batch(
+    width: int, engine: str, paragraphs: list[_Paragraph]
+) -> list[list[str]]:
+    wrap = _get_wrap_engine(engine)
+
+    return [_wrap_one(p, width, wrap) for p in paragraphs]
+
+
+def _wrap_paragraphs_parallel(
+    paragraphs: list[_Paragraph], width: int, engine: str, workers: int
+) -> str:
+    batches = _split_into_batches(
+        paragraphs, [len(p.text) for p in paragraphs], workers
+    )
+    wrapped = _map_batches(
+        functools.partial(_wrap_paragraph_batch, width, engine), batches, workers
+    )
+    assembler = _LineAssembler()
+    lines: list[str] = []
+
+    for p, paragraph_lines in zip(paragraphs, wrapped):
+        lines.extend(assembler.add(p, paragraph_lines))
+
+    lines.extend(assembler.finish())
+
+    return "\n".join(lines)
+
+
+def _terminal_wrap_batch(
+    width: int, engine: str, width_mode: str, texts: list[str]
+) -> list[str]:
+    return [terminal_wrap(text, width, engine, width_mode=width_mode) for text in texts]
+
+
+def terminal_wrap_many(
+    texts: Iterable[str],
+    width: Union[int, None] = None,
+    engine: str = "slices",
+    workers: int = 1,
+    width_mode: str = "chars",
+) -> list[str]:
+    """
+    Returns the result of terminal_wrap for each text, in the same order.
+
+    With more than one worker, the texts are wrapped in a pool of worker
+    processes, unless their total length is below PARALLEL_THRESHOLD characters.
+    Pass os.cpu_count() to use one for each CPU.
+    """
+    _get_wrap_engine(engine)
+    _check_width_mode(width_mode)
+    texts = list(texts)
+
+    if width is None:
+        width = _get_terminal_columns(fallback=1000000)
+
+    sizes = [len(text) for text in texts]
+
+    if workers <= 1 or sum(sizes) < PARALLEL_THRESHOLD:
+        return _terminal_wrap_batch(width, engine, width_mode, texts)
+
+    return _map_batches(
+        functools.partial(_terminal_wrap_batch, width, engine, width_mode),
+        _split_into_batches(texts, sizes, workers),
+        workers,
+    )
+
+
+import sys
+from collections import OrderedDict
+
+
+class WrapCache:
+    """
+    A bounded, thread-safe LRU cache of terminal_wrap results keyed on the text,
+    the width, the engine and the width mode.
+
+    The least recently used entries are evicted when either max_entries or
+    max_bytes would be exceeded. Results larger than max_bytes are not cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 4 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple[str, int, str, str], tuple[str, int]]
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def wrap(
+        self,
+        text: str,
+        width: Union[int, None] = None,
+        engine: str = "slices",
+        width_mode: str = "chars",
+    ) -> str:
+        if width is None:
+            width = _get_terminal_columns(fallback=1000000)
+
+        key = (text, width, engine, width_mode)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+
+        wrapped = terminal_wrap(text, width, engine, width_mode=width_mode)
+        size = sys.getsizeof(text) + sys.getsizeof(wrapped)
+
+        if size > self.max_bytes:
+            return wrapped
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (wrapped, size)
+                self._bytes += size
+
+                while (
+                    len(self._entries) > self.max_entries
+                    or self._bytes > self.max_bytes
+                ):
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+                    self.evictions += 1
+
+        return wrapped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def __getattr__(name: str):
+    # The formatters used to be defined in this module
+    if name == "BbmpHelpFormatter":
+        from .help_formatter import BbmpHelpFormatter
+
+        return BbmpHelpFormatter
+
+    if name in ("BbmpLogFormatter", "BbmpAsyncLogHandler"):
+        from . import log_formatter
+
+        return getattr(log_formatter, name)
 
-        return terminal_wrap(formatted)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
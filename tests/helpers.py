@@ -0,0 +1,72 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import random
+import unittest
+from typing import Any, Callable, Sequence
+
+from bbmp_toolbox import terminal_wrap
+
+FRAGMENTS = (
+    "word",
+    "x" * 30,
+    " ",
+    "    ",
+    "\t",
+    "\n",
+    "\n\n",
+    "\n\n\n",
+    "  \n",
+    "'",
+    '"',
+    "`",
+    "``",
+    "```",
+    "\n```\n",
+    "'s",
+    " '",
+    "', ",
+    "字",
+)
+"""
+Fragments for random texts, covering long words, whitespace runs, paragraph breaks,
+quotes, code fences and wide characters.
+"""
+
+
+def random_text(
+    rng: random.Random,
+    fragments: Sequence[str],
+    min_length: int,
+    max_length: int,
+    separator: str = "",
+) -> str:
+    """
+    Returns min_length to max_length fragments chosen at random, joined with the
+    separator.
+    """
+    return separator.join(
+        rng.choice(fragments) for _ in range(rng.randint(min_length, max_length))
+    )
+
+
+def assert_matches_terminal_wrap(
+    test: unittest.TestCase,
+    wrap: Callable[[str], str],
+    width: int,
+    count: int = 2000,
+    fragments: Sequence[str] = FRAGMENTS,
+    max_length: int = 60,
+    **options: Any,
+) -> None:
+    """
+    Asserts that wrap(text) equals terminal_wrap(text, width, **options) for count
+    random texts of up to max_length fragments.
+    """
+    rng = random.Random(0)
+
+    for _ in range(count):
+        text = random_text(rng, fragments, 0, max_length)
+
+        with test.subTest(text=text):
+            test.assertEqual(terminal_wrap(text, width, **options), wrap(text))
@@ -0,0 +1,66 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import os
+import subprocess
+import sys
+import unittest
+
+
+def import_times(code: str) -> dict[str, int]:
+    """
+    Runs the code in a new interpreter, and returns the cumulative import time
+    of each module imported by it in microseconds.
+    """
+    # Without bytecode, bbmp_toolbox would be compiled on every run, but the
+    # standard library wouldn't
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=env,
+    )
+    times: dict[str, int] = {}
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        _, cumulative, name = line[len("import time:") :].split("|")
+
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    def test_wrapping_doesnt_import_argparse_or_logging(self):
+        times = import_times(
+            "import bbmp_toolbox; bbmp_toolbox.terminal_wrap('text', 80)"
+        )
+
+        for module in ("argparse", "logging", "concurrent.futures", "asyncio"):
+            self.assertNotIn(module, times)
+
+    def test_formatters_are_imported_on_first_use(self):
+        times = import_times("from bbmp_toolbox import BbmpHelpFormatter")
+
+        self.assertIn("argparse", times)
+        self.assertNotIn("logging", times)
+
+    def test_import_budget(self):
+        # The budget is relative to the modules that used to be imported
+        # eagerly, measured in separate interpreters, so that it doesn't depend
+        # on the machine. The fastest of a few runs is kept.
+        def import_time(module: str) -> int:
+            return min(import_times(f"import {module}")[module] for _ in range(5))
+
+        self.assertLess(
+            import_time("bbmp_toolbox"),
+            import_time("argparse") + import_time("logging"),
+        )
@@ -0,0 +1,89 @@
+# MIT No Attribution
+# Copyright (c) 2025 Attila Szarvas
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from bbmp_toolbox import terminal_wrap
+from bbmp_toolbox.__main__ import _wrap_input
+
+from helpers import FRAGMENTS, random_text
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "input.txt")
+
+    def write(self, text: str) -> None:
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+
+    def test_chunks_match_terminal_wrap(self):
+        rng = random.Random(0)
+
+        for _ in range(500):
+            text = random_text(rng, FRAGMENTS, 0, 200)
+            self.write(text)
+
+            with open(self.path, "rb") as f:
+                wrapped = b"".join(_wrap_input(f, 20, "slices", "chars", 1, 1))
+
+            with self.subTest(text=text):
+                self.assertEqual(terminal_wrap(text, 20), wrapped.decode())
+
+    def run_main(self, *args: str, stdin=None) -> str:
+        result = subprocess.run(
+            [sys.executable, "-m", "bbmp_toolbox", *args],
+            stdin=stdin,
+            capture_output=True,
+            check=True,
+        )
+
+        return result.stdout.decode()
+
+    def test_file_stdin_and_workers(self):
+        rng = random.Random(1)
+        text = "\n\n".join(random_text(rng, FRAGMENTS, 0, 200) for _ in range(200))
+        self.write(text)
+        expected = terminal_wrap(text, 30) + "\n"
+
+        self.assertEqual(expected, self.run_main("-w", "30", self.path))
+        self.assertEqual(
+            expected,
+            self.run_main("-w", "30", "-j", "2", "--chunk-size", "100", self.path),
+        )
+
+        with open(self.path, "rb") as f:
+            self.assertEqual(expected, self.run_main("-w", "30", stdin=f))
+
+        # A pipe can't be memory-mapped, so it's wrapped as a stream
+        result = subprocess.run(
+            [sys.executable, "-m", "bbmp_toolbox", "-w", "30"],
+            input=text.encode(),
+            capture_output=True,
+            check=True,
+        )
+        self.assertEqual(expected, result.stdout.decode())
+
+    def test_prog(self):
+        self.assertTrue(self.run_main("--help").startswith("usage: python -m"))
+
+        # The console script runs main() with its own path as argv[0]
+        script = "import sys; from bbmp_toolbox.__main__ import main; "
+        script += "sys.argv[0] = '/usr/local/bin/bbmp-wrap'; main()"
+        result = subprocess.run(
+            [sys.executable, "-c", script, "--help"],
+            capture_output=True,
+            check=True,
+        )
+        self.assertTrue(result.stdout.decode().startswith("usage: bbmp-wrap "))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,100 @@
 # MIT No Attribution
 # Copyright (c) 2025 Attila Szarvas
 
+import argparse
+import asyncio
+import io
+import logging
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import unicodedata
 import unittest
+from typing import Union
+from unittest import mock
 
-from bbmp_toolbox import terminal_wrap
+from bbmp_toolbox import (
+    terminal_wrap,
+    terminal_wrap_stream,
+    terminal_wrap_many,
+    terminal_wrap_into,
+    set_terminal_columns,
+    invalidate_terminal_columns,
+    install_sigwinch_handler,
+    WrapCache,
+    WrapDocument,
+    IncrementalWrapper,
+    WrappingTextIO,
+    WrapProfile,
+    profile_stages,
+    BbmpHelpFormatter,
+    BbmpLogFormatter,
+    BbmpAsyncLogHandler,
+    BbmpQueueHandler,
+    BbmpLogListener,
+    PersistentWrapCache,
+    terminal_wrap_async,
+    terminal_wrap_async_stream,
+    terminal_wrap_to_writer,
+)
+from bbmp_toolbox import _display_widths
+from bbmp_toolbox.terminal_wrap import (
+    _parse_paragraphs,
+    _DisplayWidths,
+    _display_width,
+    _words,
+    _BreakOpportunities,
+    wrap_paragraph_slices,
+    wrap_paragraph_optimal,
+    PARALLEL_THRESHOLD,
+)
+
+from helpers import FRAGMENTS, assert_matches_terminal_wrap, random_text
+
+ENGINES = ("chars", "slices")
+
+
+def least_raggedness(p, width: int) -> int:
+    """
+    The least cost wrap_paragraph_optimal can achieve, found by trying every
+    earlier break for every break.
+    """
+    starts, ends = _words(p.text, _BreakOpportunities(p.text))
+    column = (lambda i: i) if p.columns is None else (lambda i: p.columns[i])
+    n = len(starts)
+    best = [0.0] + [float("inf")] * n
+
+    for j in range(1, n + 1):
+        for i in range(j):
+            indent = p.indentation.for_line if i == 0 else p.indentation.for_next_line
+            slack = width - indent - (column(ends[j - 1]) - column(starts[i]))
+
+            if slack < 0 and j > i + 1:
+                continue
+
+            cost = 0 if j == n or slack < 0 else slack * slack
+            best[j] = min(best[j], best[i] + cost)
+
+    return int(best[n])
+
+
+def raggedness(p, width: int, lines: list[str]) -> int:
+    cost = 0
+
+    for k, line in enumerate(lines[:-1]):
+        indent = p.indentation.for_line if k == 0 else p.indentation.for_next_line
+        content = line[indent:]
+        slack = width - indent
+        slack -= len(content) if p.columns is None else _display_width(content)
+        cost += max(slack, 0) ** 2
+
+    return cost
 
 
 class TestTerminalWrap(unittest.TestCase):
@@ -94,7 +185,9 @@ use tripple backticks.
 
 As you can see, the triple backticks will be omitted from the output."""
 
-        self.assertEqual(expected_80, terminal_wrap(text, 80))
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(expected_80, terminal_wrap(text, 80, engine=engine))
 
         expected_60 = """Ordinary paragraphs can be freely wrapped along word
 boundaries. The resulting lines can be no longer than the
@@ -148,7 +241,9 @@ wrapping: that is to use tripple backticks.
 As you can see, the triple backticks will be omitted from
 the output."""
 
-        self.assertEqual(expected_60, terminal_wrap(text, 60))
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(expected_60, terminal_wrap(text, 60, engine=engine))
 
     def test_terminal_wrap_2(self):
         text = f"""This script can set up the current working directory for
@@ -189,7 +284,998 @@ EXAMPLE:
         If the version number is ommitted, something will default to
         3.12."""
 
-        self.assertEqual(expected_72, terminal_wrap(text, 72))
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(expected_72, terminal_wrap(text, 72, engine=engine))
+
+    def test_engines_are_identical(self):
+        for width in (1, 10, 40):
+            with self.subTest(width=width):
+                assert_matches_terminal_wrap(
+                    self,
+                    lambda text: terminal_wrap(text, width, engine="slices"),
+                    width,
+                    engine="chars",
+                )
+
+    def test_optimal_minimizes_raggedness(self):
+        fragments = ["a", "bb", "ccc", "dddd", "x" * 12, " ", "  ", "'q q'", '"d d"']
+        fragments += ["字字", "`c c`"]
+        rng = random.Random(0)
+
+        for _ in range(1000):
+            body = random_text(rng, fragments, 1, 40, separator=" ")
+            text = rng.choice(["", "   ", "  -  "]) + body
+            width = rng.randint(3, 30)
+            width_mode = rng.choice(["chars", "display"])
+
+            for p in _parse_paragraphs(text, width_mode):
+                greedy = wrap_paragraph_slices(p, width)
+                lines = wrap_paragraph_optimal(p, width)
+
+                with self.subTest(text=p.text, width=width, width_mode=width_mode):
+                    self.assertEqual(" ".join(greedy).split(), " ".join(lines).split())
+
+                    if len(greedy) > 1:
+                        self.assertEqual(
+                            least_raggedness(p, width), raggedness(p, width, lines)
+                        )
+                    else:
+                        self.assertEqual(greedy, lines)
+
+    def test_optimal_fills_lines_evenly(self):
+        text = "  -  aaa bb cc ddddd"
+
+        self.assertEqual("  -  aaa bb\n     cc\n     ddddd", terminal_wrap(text, 11))
+        self.assertEqual(
+            "  -  aaa\n     bb cc\n     ddddd",
+            terminal_wrap(text, 11, engine="optimal"),
+        )
+
+    def test_stream_matches_terminal_wrap(self):
+        rng = random.Random(1)
+
+        def wrap(text: str) -> str:
+            cuts = sorted(rng.randint(0, len(text)) for _ in range(rng.randint(0, 8)))
+            chunks = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+            return "\n".join(terminal_wrap_stream(chunks, 20))
+
+        assert_matches_terminal_wrap(self, wrap, 20)
+
+    def test_stream_yields_lines_before_the_input_ends(self):
+        def chunks():
+            yield "First paragraph, which is long enough to be wrapped.\n\n"
+            yield "Second "
+            raise AssertionError("The first paragraph wasn't yielded in time")
+
+        lines = terminal_wrap_stream(chunks(), 30)
+
+        self.assertEqual("First paragraph, which is long", next(lines))
+
+    def test_document_matches_terminal_wrap(self):
+        # Every width renders the same documents, to cover re-rendering
+        documents: dict[str, WrapDocument] = {}
+
+        def render(text: str, width: int) -> str:
+            return documents.setdefault(text, WrapDocument(text)).render(width)
+
+        for width in (1, 10, 40, 80):
+            with self.subTest(width=width):
+                assert_matches_terminal_wrap(
+                    self, lambda text: render(text, width), width, count=500
+                )
+
+    def test_display_width(self):
+        self.assertEqual(
+            "日本語 テキスト\nです",
+            terminal_wrap("日本語 テキスト です", 15, width_mode="display"),
+        )
+        self.assertEqual(
+            "cafe\u0301 cafe\u0301\ncafe\u0301",
+            terminal_wrap("cafe\u0301 cafe\u0301 cafe\u0301", 9, width_mode="display"),
+        )
+        self.assertEqual(
+            "  字字  字字字字\n        字字字字",
+            terminal_wrap("  字字  字字字字 字字字字", 16, width_mode="display"),
+        )
+
+    @unittest.skipIf(
+        _display_widths.UNIDATA_VERSION != unicodedata.unidata_version,
+        "The table is built at runtime for this Unicode version",
+    )
+    def test_display_width_table_is_up_to_date(self):
+        self.assertEqual(
+            (list(_display_widths.STARTS), list(_display_widths.WIDTHS)),
+            _DisplayWidths.scan(),
+        )
+
+    def test_display_width_table_is_used_up_to_its_version(self):
+        for version, uses_table in (
+            ("13.0.0", True),
+            (_display_widths.UNIDATA_VERSION, True),
+            ("99.0.0", False),
+        ):
+            widths = _DisplayWidths()
+
+            with mock.patch.object(unicodedata, "unidata_version", version):
+                with mock.patch.object(
+                    _DisplayWidths, "scan", return_value=([0], [1])
+                ) as scan:
+                    widths.of("字")
+
+            with self.subTest(version=version):
+                self.assertEqual(not uses_table, scan.called)
+                self.assertEqual(uses_table, widths._starts is _display_widths.STARTS)
+
+    def test_display_width_engines_are_identical(self):
+        fragments = FRAGMENTS + ("字字字字字", "e\u0301")
+        wraps = {
+            "slices": lambda text: terminal_wrap(
+                text, 10, engine="slices", width_mode="display"
+            ),
+            "stream": lambda text: "\n".join(
+                terminal_wrap_stream([text], 10, width_mode="display")
+            ),
+            "document": lambda text: WrapDocument(text, width_mode="display").render(
+                10
+            ),
+        }
+
+        for name, wrap in wraps.items():
+            with self.subTest(name=name):
+                assert_matches_terminal_wrap(
+                    self,
+                    wrap,
+                    10,
+                    fragments=fragments,
+                    engine="chars",
+                    width_mode="display",
+                )
+
+    def test_escape_sequences_have_no_width(self):
+        text = "\x1b[1mINFO\x1b[0m \x1b[31mthe quick brown fox jumps\x1b[0m over"
+
+        self.assertEqual(
+            "\x1b[1mINFO\x1b[0m \x1b[31mthe quick\n\x1b[31mbrown fox\n"
+            "\x1b[31mjumps\x1b[0m over",
+            terminal_wrap(text, 15),
+        )
+
+    def test_escape_sequence_before_a_long_word_stays_with_it(self):
+        self.assertEqual(
+            "\n\x1b[1mxxxxxxxxxxx", terminal_wrap("``````\n\x1b[1mxxxxxxxxxxx", 10)
+        )
+
+    def test_only_styles_in_effect_are_restored(self):
+        text = " ".join("\x1b[31mred\x1b[39m plain" for _ in range(50))
+        lines = terminal_wrap(text, 30).split("\n")
+
+        # Each line has the escapes of its own words, and at most one restoring
+        # the color
+        for line in lines:
+            self.assertLessEqual(line.count("\x1b"), 2 * line.count("red") + 1)
+
+        self.assertEqual(
+            "\x1b[1;38;5;196mbold red\n\x1b[1;38;5;196mwords\x1b[22m\n"
+            "\x1b[38;5;196mplain\x1b[0m\nand reset",
+            terminal_wrap(
+                "\x1b[1;38;5;196mbold red words\x1b[22m plain\x1b[0m and reset", 9
+            ),
+        )
+
+    def test_escape_sequences_engines_are_identical(self):
+        fragments = FRAGMENTS + ("\x1b[31m", "\x1b[0m", "\x1b[1;4m", "\x1b[K")
+
+        for width_mode in ("chars", "display"):
+            wraps = {
+                "slices": lambda text: terminal_wrap(
+                    text, 10, "slices", width_mode=width_mode
+                ),
+                "document": lambda text: WrapDocument(
+                    text, width_mode=width_mode
+                ).render(10),
+            }
+
+            for name, wrap in wraps.items():
+                with self.subTest(width_mode=width_mode, name=name):
+                    assert_matches_terminal_wrap(
+                        self,
+                        wrap,
+                        10,
+                        fragments=fragments,
+                        engine="chars",
+                        width_mode=width_mode,
+                    )
+
+    def test_escape_sequences_dont_change_the_wrapping(self):
+        fragments = FRAGMENTS + (
+            "\x1b[31mword",
+            "word\x1b[0m",
+            "\x1b[1;4m字",
+            "x\x1b[K",
+        )
+        rng = random.Random(0)
+        escapes = re.compile(r"\x1b\[[0-9;]*[mK]")
+
+        for _ in range(2000):
+            text = random_text(rng, fragments, 0, 60)
+
+            for width_mode in ("chars", "display"):
+                with self.subTest(text=text, width_mode=width_mode):
+                    self.assertEqual(
+                        terminal_wrap(escapes.sub("", text), 10, width_mode=width_mode),
+                        escapes.sub("", terminal_wrap(text, 10, width_mode=width_mode)),
+                    )
+
+    def test_unknown_width_mode(self):
+        with self.assertRaises(ValueError):
+            terminal_wrap("text", 80, width_mode="nonexistent")
+
+    def test_into_matches_terminal_wrap(self):
+        def wrap(text: str) -> str:
+            sink = io.StringIO()
+            terminal_wrap_into(text, 20, sink)
+            return sink.getvalue()
+
+        assert_matches_terminal_wrap(self, wrap, 20, count=500)
+
+    def test_parallel_matches_serial(self):
+        rng = random.Random(0)
+        texts = [random_text(rng, FRAGMENTS, 0, 200) for _ in range(1000)]
+        text = "\n\n".join(texts * 4)
+
+        self.assertEqual(terminal_wrap(text, 40), terminal_wrap(text, 40, workers=2))
+        self.assertEqual(
+            [terminal_wrap(t, 40) for t in texts * 4],
+            terminal_wrap_many(texts * 4, 40, workers=2),
+        )
+
+    def test_wrap_many_uses_one_process_by_default(self):
+        texts = ["word " * 1000] * (PARALLEL_THRESHOLD // 1000)
+
+        with mock.patch("concurrent.futures.ProcessPoolExecutor") as pool:
+            wrapped = terminal_wrap_many(texts, 40)
+
+        pool.assert_not_called()
+        self.assertEqual([terminal_wrap(texts[0], 40)] * len(texts), wrapped)
+
+    def test_hanging_indentation_beyond_80_characters(self):
+        label = "  --" + "x" * 90 + "    "
+        text = label + "first line of the help\n" + " " * len(label) + "second line"
+
+        self.assertEqual(
+            label + "first line of the help second\n" + " " * len(label) + "line",
+            terminal_wrap(text, len(label) + 30),
+        )
+
+    def test_incremental_matches_terminal_wrap(self):
+        fragments = FRAGMENTS + ("````````````",)
+        rng = random.Random(0)
+
+        # An empty paragraph, followed by verbatim ones
+        chunk_lists = [["\n\n````````````"]]
+        chunk_lists += [
+            [random_text(rng, fragments, 0, 20) for _ in range(rng.randint(1, 10))]
+            for _ in range(200)
+        ]
+
+        for chunks in chunk_lists:
+            wrapper = IncrementalWrapper(20)
+            text = ""
+
+            for chunk in chunks:
+                wrapper.append(chunk)
+                text += chunk
+                width = rng.choice((1, 10, 20, 40))
+                wrapper.set_width(width)
+                expected = terminal_wrap(text, width)
+                lines = expected.split("\n")
+                n = rng.randint(1, 10)
+
+                with self.subTest(text=text, width=width, n=n):
+                    self.assertEqual(expected, wrapper.text())
+                    self.assertEqual(lines[-n:], wrapper.lines(-n))
+                    self.assertEqual(lines[n : 2 * n], wrapper.lines(n, 2 * n))
+                    self.assertEqual(lines, wrapper.lines())
+
+    def test_allocations_per_paragraph(self):
+        text = "\n\n".join(f"paragraph {i} with a few words" for i in range(1000))
+
+        tracemalloc.start()
+        paragraphs = _parse_paragraphs(text)
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        # The paragraph, its indentation and its text should be the only objects
+        # still allocated per paragraph
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(True, _parse_paragraphs.__code__.co_filename)]
+        )
+        count = sum(s.count for s in snapshot.statistics("filename"))
+
+        self.assertLessEqual(
+            count / len(paragraphs),
+            3,
+            f"{count} allocations for {len(paragraphs)} paragraphs",
+        )
+
+    def test_profile_stages(self):
+        text = "first paragraph\n\n```\nverbatim\n```\n\nsecond paragraph"
+
+        with profile_stages() as profile:
+            wrapped = terminal_wrap(text, 10)
+
+        terminal_wrap(text, 10)
+        stats = profile.as_dict()
+
+        self.assertEqual(list(WrapProfile.STAGES), list(stats))
+        self.assertEqual(1, stats["verbatim_blocks"]["calls"])
+        self.assertEqual(len(text), stats["verbatim_blocks"]["input_size"])
+        self.assertEqual(
+            sum(not p.is_verbatim for p in _parse_paragraphs(text)),
+            stats["wrap"]["calls"],
+        )
+        self.assertEqual(len(wrapped), stats["join"]["output_size"])
+        self.assertIn("verbatim_blocks", profile.report())
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            terminal_wrap("text", 80, engine="nonexistent")
+
+
+class TestTerminalColumns(unittest.TestCase):
+    text = "one two three four five six"
+
+    def setUp(self):
+        environ = mock.patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+        os.environ.pop("COLUMNS", None)
+
+        self.addCleanup(invalidate_terminal_columns)
+        self.addCleanup(set_terminal_columns, None)
+        invalidate_terminal_columns()
+
+    def mock_terminal_size(self, columns):
+        get_terminal_size = mock.patch(
+            "shutil.get_terminal_size", return_value=os.terminal_size((columns, 20))
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+        return get_terminal_size
+
+    def test_width_is_cached(self):
+        get_terminal_size = self.mock_terminal_size(10)
+
+        self.assertEqual("one two\nthree\nfour five\nsix", terminal_wrap(self.text))
+        terminal_wrap(self.text)
+        self.assertEqual(1, get_terminal_size.call_count)
+
+        invalidate_terminal_columns()
+        terminal_wrap(self.text)
+        self.assertEqual(2, get_terminal_size.call_count)
+
+    def install_sigwinch_handler(self):
+        self.addCleanup(
+            signal.signal, signal.SIGWINCH, signal.getsignal(signal.SIGWINCH)
+        )
+        self.assertTrue(install_sigwinch_handler())
+
+    def test_width_expires_without_sigwinch_handler(self):
+        get_terminal_size = self.mock_terminal_size(10)
+        handler = (
+            signal.getsignal(signal.SIGWINCH) if hasattr(signal, "SIGWINCH") else None
+        )
+
+        terminal_wrap(self.text)
+        terminal_wrap(self.text)
+        self.assertEqual(1, get_terminal_size.call_count)
+
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 2):
+            terminal_wrap(self.text)
+
+        self.assertEqual(2, get_terminal_size.call_count)
+
+        # Wrapping doesn't install a handler on its own
+        if hasattr(signal, "SIGWINCH"):
+            self.assertIs(handler, signal.getsignal(signal.SIGWINCH))
+
+    @unittest.skipUnless(hasattr(signal, "SIGWINCH"), "SIGWINCH is not available")
+    def test_sigwinch_invalidates(self):
+        get_terminal_size = self.mock_terminal_size(10)
+        self.install_sigwinch_handler()
+
+        terminal_wrap(self.text)
+
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 2):
+            terminal_wrap(self.text)
+
+        self.assertEqual(1, get_terminal_size.call_count)
+
+        os.kill(os.getpid(), signal.SIGWINCH)
+        terminal_wrap(self.text)
+        self.assertEqual(2, get_terminal_size.call_count)
+
+    @unittest.skipUnless(hasattr(signal, "SIGWINCH"), "SIGWINCH is not available")
+    def test_replaced_sigwinch_handler_falls_back_to_ttl(self):
+        get_terminal_size = self.mock_terminal_size(10)
+        self.install_sigwinch_handler()
+        terminal_wrap(self.text)
+
+        signal.signal(signal.SIGWINCH, lambda signum, frame: None)
+        terminal_wrap(self.text)
+        self.assertEqual(1, get_terminal_size.call_count)
+
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 2):
+            terminal_wrap(self.text)
+
+        self.assertEqual(2, get_terminal_size.call_count)
+
+    def test_columns_environment_variable_overrides(self):
+        get_terminal_size = self.mock_terminal_size(10)
+        os.environ["COLUMNS"] = "14"
+
+        self.assertEqual("one two three\nfour five six", terminal_wrap(self.text))
+        self.assertEqual(0, get_terminal_size.call_count)
+
+    def test_pinned_width(self):
+        get_terminal_size = self.mock_terminal_size(10)
+        os.environ["COLUMNS"] = "14"
+        set_terminal_columns(100)
+
+        self.assertEqual(self.text, terminal_wrap(self.text))
+        self.assertEqual(0, get_terminal_size.call_count)
+
+
+class _DrainingWriter:
+    """
+    Stands in for an asyncio.StreamWriter, and records how much was written
+    without a drain in between.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.undrained = 0
+        self.max_undrained = 0
+        self.drains = 0
+
+    def write(self, data: bytes) -> None:
+        self.data += data
+        self.undrained += len(data)
+        self.max_undrained = max(self.max_undrained, self.undrained)
+
+    async def drain(self) -> None:
+        self.undrained = 0
+        self.drains += 1
+        await asyncio.sleep(0)
+
+
+class TestAsyncWrap(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.text = random_text(rng, FRAGMENTS, 20000, 20000)
+
+    def test_matches_terminal_wrap(self):
+        expected = terminal_wrap(self.text, 20)
+
+        for threshold in (0, len(self.text) + 1):
+            with self.subTest(threshold=threshold):
+                self.assertEqual(
+                    expected,
+                    asyncio.run(
+                        terminal_wrap_async(self.text, 20, threshold=threshold)
+                    ),
+                )
+
+    def test_stream_matches_terminal_wrap(self):
+        encoded = self.text.encode()
+
+        async def bytes_chunks():
+            # Cuts through multibyte characters too
+            for i in range(0, len(encoded), 1000):
+                yield encoded[i : i + 1000]
+
+        async def str_chunks():
+            for i in range(0, len(self.text), 777):
+                yield self.text[i : i + 777]
+
+        async def reader():
+            stream = asyncio.StreamReader()
+            stream.feed_data(encoded)
+            stream.feed_eof()
+
+            return stream
+
+        async def collect(source, threshold):
+            return [
+                line
+                async for line in terminal_wrap_async_stream(
+                    await source if asyncio.iscoroutine(source) else source,
+                    20,
+                    threshold=threshold,
+                )
+            ]
+
+        expected = terminal_wrap(self.text, 20)
+
+        for make_source in (bytes_chunks, str_chunks, reader):
+            for threshold in (0, 1000000):
+                with self.subTest(source=make_source.__name__, threshold=threshold):
+                    lines = asyncio.run(collect(make_source(), threshold))
+                    self.assertEqual(expected, "\n".join(lines))
+
+    def test_writer_is_drained(self):
+        expected = terminal_wrap(self.text, 20).encode()
+
+        async def chunks():
+            yield self.text
+
+        for source in (self.text, chunks()):
+            writer = _DrainingWriter()
+            asyncio.run(terminal_wrap_to_writer(source, writer, 20))  # type: ignore
+
+            with self.subTest(source=type(source).__name__):
+                self.assertEqual(expected, bytes(writer.data))
+                self.assertEqual(0, writer.undrained)
+                self.assertGreater(writer.drains, 1)
+                self.assertLess(writer.max_undrained, 2 * 64 * 1024)
+
+    def test_event_loop_stall(self):
+        text = self.text * 10
+
+        async def max_stall(wrap) -> float:
+            """
+            Returns the longest time the loop didn't get to run a ticking task,
+            while the text was being wrapped.
+            """
+            stall = 0.0
+            done = False
+
+            async def tick():
+                nonlocal stall
+                last = time.perf_counter()
+
+                while not done:
+                    await asyncio.sleep(0)
+                    now = time.perf_counter()
+                    stall = max(stall, now - last)
+                    last = now
+
+            ticker = asyncio.create_task(tick())
+            await asyncio.sleep(0)
+            await wrap()
+            done = True
+            await ticker
+
+            return stall
+
+        async def inline():
+            terminal_wrap(text, 20)
+
+        async def offloaded():
+            await terminal_wrap_async(text, 20)
+
+        inline_stall = asyncio.run(max_stall(inline))
+        offloaded_stall = asyncio.run(max_stall(offloaded))
+
+        # The thread wrapping the text releases the GIL at every switch interval
+        self.assertLess(offloaded_stall, inline_stall / 4)
+
+
+class _CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s: str) -> int:
+        self.writes += 1
+        return super().write(s)
+
+
+class TestWrappingTextIO(unittest.TestCase):
+    def test_matches_terminal_wrap(self):
+        rng = random.Random(0)
+
+        for _ in range(2000):
+            text = random_text(rng, FRAGMENTS, 0, 60)
+            cuts = sorted(rng.randint(0, len(text)) for _ in range(rng.randint(0, 8)))
+            stream = io.StringIO()
+
+            with WrappingTextIO(stream, 20, buffer_size=rng.choice([1, 1000])) as f:
+                for a, b in zip([0] + cuts, cuts + [len(text)]):
+                    f.write(text[a:b])
+
+            # The final newline is kept, unless it's inside a verbatim block
+            expected = terminal_wrap(text, 20)
+
+            if text.endswith("\n") and text.count("```") % 2 == 0:
+                expected += "\n"
+
+            with self.subTest(text=text):
+                self.assertEqual(expected, stream.getvalue())
+
+    def test_writes_are_batched(self):
+        stream = _CountingStream()
+
+        with WrappingTextIO(stream, 30) as f:
+            for i in range(1000):
+                print(f"Paragraph {i}, which is long enough to be wrapped.\n", file=f)
+
+        self.assertEqual(1000 * 3, stream.getvalue().count("\n"))
+        self.assertLess(stream.writes, 10)
+
+    def test_forwards_stream_attributes(self):
+        with tempfile.TemporaryFile(
+            "w+", encoding="latin-1", errors="replace"
+        ) as stream:
+            with WrappingTextIO(stream, 10) as f:
+                self.assertEqual("latin-1", f.encoding)
+                self.assertEqual("replace", f.errors)
+                self.assertEqual(stream.fileno(), f.fileno())
+
+        with WrappingTextIO(io.StringIO(), 10) as f:
+            with self.assertRaises(io.UnsupportedOperation):
+                f.fileno()
+
+    def test_close_after_stream_is_closed(self):
+        stream = tempfile.TemporaryFile("w+")
+        f = WrappingTextIO(stream, 10, flush_on_newline=True)
+        f.write("written\n")
+        stream.close()
+
+        # Nothing is left to write, so closing doesn't touch the stream
+        f.close()
+
+        f = WrappingTextIO(stream, 10)
+        f.write("held")
+
+        with self.assertRaises(ValueError):
+            f.close()
+
+    def test_flush_on_newline(self):
+        stream = io.StringIO()
+        f = WrappingTextIO(stream, 10, flush_on_newline=True)
+
+        print("one two three", file=f)
+        self.assertEqual("one two\nthree\n", stream.getvalue())
+
+        print("```\none two three", file=f)
+        self.assertEqual("one two\nthree\n", stream.getvalue())
+
+        print("```", file=f)
+        self.assertEqual("one two\nthree\n\none two three\n\n", stream.getvalue())
+
+    def test_flush_timeout(self):
+        stream = io.StringIO()
+        f = WrappingTextIO(stream, 10, flush_timeout=0.01)
+        f.write("Continue? [y/n]")
+        deadline = time.monotonic() + 10
+
+        while not stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual("Continue?\n[y/n]", stream.getvalue())
+        f.close()
+
+
+class TestWrapCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = WrapCache()
+
+        self.assertEqual("one two\nthree", cache.wrap("one two three", 10))
+        self.assertEqual("one two\nthree", cache.wrap("one two three", 10))
+        self.assertEqual("one two three", cache.wrap("one two three", 20))
+        self.assertEqual((1, 2, 0), (cache.hits, cache.misses, cache.evictions))
+
+    def test_evicts_least_recently_used(self):
+        cache = WrapCache(max_entries=2)
+        cache.wrap("a", 10)
+        cache.wrap("b", 10)
+        cache.wrap("a", 10)
+        cache.wrap("c", 10)
+
+        self.assertEqual(2, len(cache))
+        self.assertEqual(1, cache.evictions)
+
+        cache.wrap("a", 10)
+        self.assertEqual(2, cache.hits)
+
+    def test_max_bytes(self):
+        cache = WrapCache(max_bytes=1000)
+        cache.wrap("x" * 2000, 10)
+        self.assertEqual(0, len(cache))
+
+        for text in "abcdefghij":
+            cache.wrap(text * 100, 10)
+
+        self.assertLessEqual(cache.size_bytes, 1000)
+        self.assertGreater(cache.evictions, 0)
+
+    def test_help_formatter(self):
+        parser = argparse.ArgumentParser(
+            description="A description long enough to be wrapped.",
+            formatter_class=BbmpHelpFormatter,
+        )
+        cache = WrapCache()
+        mock.patch.object(BbmpHelpFormatter, "wrap_cache", cache).start()
+        self.addCleanup(mock.patch.stopall)
+
+        help_text = parser.format_help()
+        self.assertEqual(help_text, parser.format_help())
+        self.assertEqual(1, cache.hits)
+
+
+class TestPersistentWrapCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "help.cache")
+
+    def test_reused_after_save(self):
+        cache = PersistentWrapCache(self.path)
+        self.assertEqual("one two\nthree", cache.wrap("one two three", 10))
+        cache.save()
+
+        cache = PersistentWrapCache(self.path)
+        self.assertEqual("one two\nthree", cache.wrap("one two three", 10))
+        self.assertEqual("one two three", cache.wrap("one two three", 20))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_memory_mapped(self):
+        texts = [f"text {i} " * 100 for i in range(300)]
+        cache = PersistentWrapCache(self.path)
+
+        for text in texts:
+            cache.wrap(text, 40)
+
+        cache.save()
+        cache = PersistentWrapCache(self.path)
+
+        for text in texts:
+            self.assertEqual(terminal_wrap(text, 40), cache.wrap(text, 40))
+
+        self.assertEqual(len(texts), cache.hits)
+
+    def test_ignores_other_versions_and_corrupt_files(self):
+        cache = PersistentWrapCache(self.path)
+        cache.wrap("one two three", 10)
+        cache.save()
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        for corrupted in (
+            data.replace(b"bbmp-wrap-cache 1 ", b"bbmp-wrap-cache 1 0"),
+            data[:-3],
+            b"garbage",
+        ):
+            with open(self.path, "wb") as f:
+                f.write(corrupted)
+
+            cache = PersistentWrapCache(self.path)
+
+            with self.subTest(corrupted=corrupted):
+                self.assertEqual("one two\nthree", cache.wrap("one two three", 10))
+                self.assertEqual(0, cache.hits)
+
+    def test_max_bytes(self):
+        cache = PersistentWrapCache(self.path, max_bytes=1000)
+
+        for text in "abcdefghij":
+            cache.wrap(text * 100, 10)
+
+        cache.save()
+        cache = PersistentWrapCache(self.path, max_bytes=1000)
+        cache.wrap("x", 10)
+        cache.save()
+
+        self.assertLessEqual(os.path.getsize(self.path), 1000)
+
+    def test_invalidate(self):
+        cache = PersistentWrapCache(self.path)
+        cache.wrap("one two three", 10)
+        cache.save()
+        cache.invalidate()
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(0, len(PersistentWrapCache(self.path)))
+
+    def test_help_formatter(self):
+        parser = argparse.ArgumentParser(
+            description="A description long enough to be wrapped.",
+            formatter_class=BbmpHelpFormatter,
+        )
+        cache = PersistentWrapCache(self.path)
+        mock.patch.object(BbmpHelpFormatter, "wrap_cache", cache).start()
+        self.addCleanup(mock.patch.stopall)
+        help_text = parser.format_help()
+        cache.save()
+
+        cache = PersistentWrapCache(self.path)
+        mock.patch.object(BbmpHelpFormatter, "wrap_cache", cache).start()
+
+        self.assertEqual(help_text, parser.format_help())
+        self.assertEqual(1, cache.hits)
+
+
+class _RecordingHandler(logging.Handler):
+    def __init__(self, release: Union[threading.Event, None] = None):
+        super().__init__()
+        self.setFormatter(BbmpLogFormatter("%(message)s"))
+        self.messages: list[str] = []
+        self.threads: list[threading.Thread] = []
+        self.started = threading.Event()
+        self.release_event = release
+        self.addFilter(self.wait_for_release)
+
+    def wait_for_release(self, record):
+        # Filters run before the handler's lock is acquired
+        self.started.set()
+        release = self.release_event
+
+        if release is not None:
+            self.release_event = None
+            release.wait()
+
+        return True
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.threads.append(threading.current_thread())
+
+
+class TestBbmpAsyncLogHandler(unittest.TestCase):
+    def setUp(self):
+        set_terminal_columns(20)
+        self.addCleanup(set_terminal_columns, None)
+
+        self.logger = logging.getLogger(f"{__name__}.{self.id()}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+
+    def attach(self, handler):
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+
+    def test_formats_in_order_on_the_worker_thread(self):
+        target = _RecordingHandler()
+        handler = BbmpAsyncLogHandler(target)
+        self.attach(handler)
+
+        for i in range(100):
+            self.logger.info("message number %d is wrapped", i)
+
+        handler.close()
+
+        self.assertEqual(
+            [terminal_wrap(f"message number {i} is wrapped") for i in range(100)],
+            target.messages,
+        )
+        self.assertNotIn(threading.current_thread(), target.threads)
+
+    def fill_queue(self, overflow):
+        release = threading.Event()
+        target = _RecordingHandler(release)
+        handler = BbmpAsyncLogHandler(target, maxsize=1, overflow=overflow)
+        self.attach(handler)
+        self.addCleanup(release.set)
+
+        self.logger.info("first")
+        target.started.wait()
+        self.logger.info("second")
+        self.logger.info("third message is not wrapped")
+        release.set()
+        handler.close()
+
+        return handler, target
+
+    def test_drop_on_overflow(self):
+        handler, target = self.fill_queue("drop")
+
+        self.assertEqual(["first", "second"], target.messages)
+        self.assertEqual(1, handler.dropped)
+
+    def test_unwrapped_on_overflow(self):
+        handler, target = self.fill_queue("unwrapped")
+
+        self.assertEqual(
+            ["third message is not wrapped", "first", "second"], target.messages
+        )
+
+    def test_unknown_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            BbmpAsyncLogHandler(overflow="nonexistent")
+
+
+class TestBbmpLogFormatter(unittest.TestCase):
+    def setUp(self):
+        set_terminal_columns(30)
+        self.addCleanup(set_terminal_columns, None)
+
+    def format(self, fmt: Union[str, None], message: str) -> str:
+        formatter = BbmpLogFormatter(fmt, indent_message=True)
+        record = logging.LogRecord("name", logging.INFO, "", 0, message, None, None)
+
+        return formatter.format(record)
+
+    def test_indent_message(self):
+        self.assertEqual(
+            "INFO  a message that is long\n      enough to be wrapped",
+            self.format(
+                "%(levelname)s %(message)s",
+                "a message that is long enough to be wrapped",
+            ),
+        )
+
+    def test_default_format(self):
+        # Like logging.Formatter, None stands for "%(message)s"
+        self.assertEqual(
+            " a message that is long enough\n to be wrapped",
+            self.format(None, "a message that is long enough to be wrapped"),
+        )
+
+    def test_message_contained_in_prefix(self):
+        self.assertEqual("INFO  INFO", self.format("%(levelname)s %(message)s", "INFO"))
+
+    def test_empty_message(self):
+        self.assertEqual("INFO", self.format("%(levelname)s %(message)s", ""))
+
+    def test_text_after_message(self):
+        self.assertEqual(
+            "INFO  a message that is\n      wrapped [name]",
+            self.format(
+                "%(levelname)s %(message)s [%(name)s]", "a message that is wrapped"
+            ),
+        )
+
+
+def _install_queue_handler(records):
+    logger = logging.getLogger("bbmp_worker")
+    logger.handlers = [BbmpQueueHandler(records)]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+
+def _log_from_worker(i: int) -> None:
+    logger = logging.getLogger("bbmp_worker")
+    logger.info("message number %d from a worker process is wrapped", i)
+
+    if i == 0:
+        try:
+            raise ValueError("failure")
+        except ValueError:
+            logger.exception("it failed")
+
+
+class TestBbmpLogListener(unittest.TestCase):
+    def test_formats_records_from_worker_processes(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        set_terminal_columns(20)
+        self.addCleanup(set_terminal_columns, None)
+        stream = io.StringIO()
+        listener = BbmpLogListener(stream)
+        self.addCleanup(listener.stop)
+
+        with ProcessPoolExecutor(
+            2, initializer=_install_queue_handler, initargs=(listener.queue,)
+        ) as pool:
+            list(pool.map(_log_from_worker, range(20)))
+
+        listener.stop()
+        output = stream.getvalue()
+
+        for i in range(20):
+            self.assertIn(
+                terminal_wrap(f"message number {i} from a worker process is wrapped")
+                + "\n",
+                output,
+            )
+
+        # The traceback is passed through without wrapping
+        self.assertIn("it failed\nTraceback (most recent call last):\n", output)
+        self.assertIn('    raise ValueError("failure")\n', output)
 
 
 if __name__ == "__main__":